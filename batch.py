@@ -0,0 +1,137 @@
+import argparse
+import glob
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from lib.model import model
+import config
+
+# File types the batch runner picks up from a directory, matching the UI's file picker
+image_extensions = ('.png', '.tif', '.jpg', '.bmp')
+
+
+def find_images(inputs):
+    """
+    Expands the command line inputs into a list of image paths
+    :param inputs: A list of image paths, directories, and glob patterns
+    :return: A sorted list of the image paths found, without duplicates
+    """
+    image_paths = set()
+    for entry in inputs:
+        if os.path.isdir(entry):
+            for file_name in os.listdir(entry):
+                if file_name.lower().endswith(image_extensions):
+                    image_paths.add(os.path.join(entry, file_name))
+        else:
+            image_paths.update(path for path in glob.glob(entry) if os.path.isfile(path))
+
+    return sorted(image_paths)
+
+
+def assign_output_names(image_paths):
+    """
+    Picks the name each image's output files and output row are given. Images are named after their file, but images
+    whose names only differ by directory or extension (such as a/x.png, b/x.png and x.tif) would overwrite each other's
+    output files while they're analyzed at once, so every one after the first is numbered.
+    :param image_paths: A list of image paths, in the order their names should be assigned
+    :return: Dictionary of form {str path: str output name}
+    """
+    file_names = [os.path.splitext(os.path.basename(path))[0] for path in image_paths]
+
+    # Names are compared without case, since the output directory may be on a case-insensitive file system
+    taken_names = {file_name.lower() for file_name in file_names}
+    assigned_names = set()
+    output_names = dict()
+
+    for path, file_name in zip(image_paths, file_names):
+        # A numbered name also has to steer clear of every image's own name, so it never takes one a later image needs
+        output_name = file_name
+        copy_number = 1
+        while output_name.lower() in assigned_names or (copy_number > 1 and output_name.lower() in taken_names):
+            copy_number += 1
+            output_name = "{0}-{1}".format(file_name, copy_number)
+
+        assigned_names.add(output_name.lower())
+        output_names[path] = output_name
+
+    return output_names
+
+
+def analyze_image(path, config_obj, output_name=None):
+    """
+    Runs the full analysis on one image, without any UI. The start point is taken from config.batch_seedYX.
+    :param path: The path to the input image
+    :param config_obj: The Config object to analyze with. Each call works on its own copy.
+    :param output_name: Optional name to give the output files and the output row, as picked by assign_output_names.
+    Defaults to the input file's name without its extension.
+    :return: The image's row of output data, in the same format the UI writes to output.csv
+    """
+    current_model = model.Model(config_obj)
+
+    current_model.set_file_paths(path, output_name)
+    current_model.spawn_proper_infile()
+    config_obj.seedYX = config_obj.batch_seedYX
+
+    # The initial image is only a working copy, so it's removed whether or not the analysis succeeds
+    try:
+        current_model.run_analysis()
+    finally:
+        os.remove(config_obj.initial_image_path)
+
+    return current_model.csv_out_string
+
+
+def main():
+    """
+    Function called on batch initialization
+    """
+    parser = argparse.ArgumentParser(description="Analyze a batch of root images without the UI, appending one row per "
+                                                 "image to output.csv as each image finishes.")
+    parser.add_argument("inputs", nargs="+", help="image files, directories of images, or glob patterns")
+    parser.add_argument("-o", "--output", help="output directory (defaults to config.outfile_path)")
+    parser.add_argument("-w", "--workers", type=int, help="number of images to analyze at once (defaults to "
+                                                          "config.batch_worker_count)")
+    args = parser.parse_args()
+
+    # generate the Config object
+    config_obj = config.Config()
+    if args.output:
+        config_obj.outfile_path = os.path.join(args.output, "")
+    os.makedirs(config_obj.outfile_path, exist_ok=True)
+
+    worker_count = args.workers if args.workers is not None else config_obj.batch_worker_count
+    image_paths = find_images(args.inputs)
+    if not image_paths:
+        print("No images found.")
+        return 1
+
+    output_names = assign_output_names(image_paths)
+    for path in image_paths:
+        if output_names[path] != os.path.splitext(os.path.basename(path))[0]:
+            print("{0} shares its name with another image, so its output is named {1}".format(path, output_names[path]))
+
+    failure_count = 0
+    with ProcessPoolExecutor(max_workers=worker_count or None) as executor, \
+            open(config_obj.outfile_path + "/output.csv", "a") as outfile:
+
+        futures = {executor.submit(analyze_image, path, config_obj, output_names[path]): path for path in image_paths}
+
+        # Write each row as soon as its image is done, so a crash partway through keeps the finished rows
+        for finished_count, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                outfile.write(future.result())
+                outfile.flush()
+                print("[{0}/{1}] {2}".format(finished_count, len(futures), path))
+            except Exception:
+                failure_count += 1
+                print("[{0}/{1}] {2} failed:\n{3}".format(finished_count, len(futures), path, traceback.format_exc()),
+                      file=sys.stderr)
+
+    return 1 if failure_count else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
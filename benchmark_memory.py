@@ -0,0 +1,150 @@
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from lib.model import model, pixel, root
+import config
+
+
+class LegacyPixel:
+    """
+    Pixel as it was laid out before PixelStore and __slots__: attributes in a __dict__, plus its own neighbor list,
+    parent and child sets and a float intensity. Only used to measure the old footprint.
+    """
+    def __init__(self, x, y, i):
+        self.x = x
+        self.y = y
+        self.intensity = i
+        self.radius = None
+        self.neighbors = [None, None, None, None, None, None, None, None]
+        self.parents = set()
+        self.children = set()
+
+
+class LegacyRoot:
+    """
+    Root as it was laid out before __slots__, with its attributes in a __dict__ and its branches in lists. Only used to
+    measure the old footprint.
+    """
+    def __init__(self, pixel_list, key):
+        self.pixel_list = pixel_list
+        self.branch_list = list()
+        self.branches_at_endpoint = list()
+        self.key = key
+
+
+def measure_instance_size(factory, count):
+    """
+    Measures the memory taken up by one instance of a class, averaged over many instances
+    :param factory: A function taking no arguments and returning a new instance
+    :param count: The number of instances to create
+    :return: The average number of bytes allocated per instance
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    instances = [factory() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # The list holding the instances isn't part of their footprint
+    return (after - before - sys.getsizeof(instances)) / len(instances)
+
+
+def build_reference_roots(path, config_obj):
+    """
+    Runs the analysis on an image as far as building its roots, tracing the memory it allocates along the way
+    :param path: The path to the reference image
+    :param config_obj: The Config object to analyze with
+    :return: Tuple of form (Model, int peak bytes), with the Model stopped just after build_roots
+    """
+    current_model = model.Model(config_obj)
+    current_model.set_file_paths(path)
+    current_model.spawn_proper_infile()
+    config_obj.seedYX = config_obj.batch_seedYX
+
+    tracemalloc.start()
+    current_model.load_image_to_array(config_obj.initial_image_path)
+    current_model.build_areas()
+    current_model.print_background()
+    current_model.build_trees()
+    current_model.build_roots()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return current_model, peak
+
+
+def main():
+    """
+    Function called on benchmark initialization
+    """
+    parser = argparse.ArgumentParser(description="Measure the memory taken up by Pixel and Root objects on a reference "
+                                                 "image, against the layout they had before PixelStore and __slots__.")
+    parser.add_argument("image", help="reference image to analyze")
+    parser.add_argument("-n", "--count", type=int, default=100000, help="number of instances to average the "
+                                                                        "per-object size over")
+    args = parser.parse_args()
+
+    # Small ints and shared floats are used for the values, so only the objects themselves are counted. The float
+    # intensity is made fresh for every legacy pixel, since each one held its own
+    def make_pixel():
+        return pixel.Pixel(1, 2, 3)
+
+    def make_legacy_pixel():
+        new_pixel = LegacyPixel(1, 2, float(args.count))
+        new_pixel.radius = 3
+        return new_pixel
+
+    def make_root():
+        new_root = root.Root([], 0)
+        new_root.total_length = new_root.average_radius = new_root.remaining_length = 1.0
+        return new_root
+
+    def make_legacy_root():
+        new_root = LegacyRoot([], 0)
+        new_root.parent_root = None
+        new_root.total_length = new_root.average_radius = new_root.remaining_length = 1.0
+        return new_root
+
+    pixel_sizes = (measure_instance_size(make_legacy_pixel, args.count),
+                   measure_instance_size(make_pixel, args.count))
+    root_sizes = (measure_instance_size(make_legacy_root, args.count),
+                  measure_instance_size(make_root, args.count))
+
+    print("Per-object footprint (bytes, old layout -> current layout):")
+    print("   - Pixel: {0:.1f} -> {1:.1f}".format(*pixel_sizes))
+    print("   - Root:  {0:.1f} -> {1:.1f}".format(*root_sizes))
+
+    config_obj = config.Config()
+    with tempfile.TemporaryDirectory() as output_directory:
+        config_obj.outfile_path = os.path.join(output_directory, "")
+        current_model, peak = build_reference_roots(args.image, config_obj)
+
+    foreground_count = current_model.tree_builder.initial_pixel_count
+    pixel_store = current_model.area_builder.pixel_store
+    pixel_count = len(pixel_store.pixel_cache)
+    root_count = len(current_model.root_builder.root_dict)
+
+    # The old layout made a Pixel for every foreground pixel up front. Now only skeleton pixels get one, and the data
+    # for every pixel lives in the PixelStore's arrays instead
+    store_size = sum(array.nbytes for array in (pixel_store.intensity, pixel_store.alive, pixel_store.radius,
+                                                pixel_store.neighbor_codes, pixel_store.parent))
+    old_size = foreground_count * pixel_sizes[0] + root_count * root_sizes[0]
+    new_size = pixel_count * pixel_sizes[1] + root_count * root_sizes[1] + store_size
+
+    print("\nReference image {0}:".format(args.image))
+    print("   - Foreground pixels: {0}".format(foreground_count))
+    print("   - Pixel objects: {0} (old layout: {1}), Root objects: {2}".format(pixel_count, foreground_count,
+                                                                              root_count))
+    print("   - Pixel data per foreground pixel (bytes): {0:.2f} -> {1:.2f}".format(old_size / foreground_count,
+                                                                                    new_size / foreground_count))
+    print("      - of which PixelStore arrays: {0:.2f}".format(store_size / foreground_count))
+    print("   - Peak traced memory per foreground pixel (bytes): {0:.1f}".format(peak / foreground_count))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+
+from batch import analyze_image
+import config
+
+
+def get_rss():
+    """
+    Reads the resident set size of this process
+    :return: The current RSS in bytes. Where /proc isn't available, the peak RSS is returned instead, and on systems
+    without the resource module (such as Windows) None is returned
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        try:
+            import resource
+        except ImportError:
+            return None
+
+        # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def main():
+    """
+    Function called on benchmark initialization
+    """
+    parser = argparse.ArgumentParser(description="Analyze the same image many times in one process and report the "
+                                                 "memory in use after each run, to catch memory that isn't freed "
+                                                 "between images.")
+    parser.add_argument("image", help="image to analyze")
+    parser.add_argument("-n", "--iterations", type=int, default=20, help="number of times to analyze the image")
+    parser.add_argument("--no-gc", action="store_true", help="turn off the cyclic garbage collector, so memory held "
+                                                             "by reference cycles shows up as growth")
+    args = parser.parse_args()
+
+    if args.no_gc:
+        gc.disable()
+
+    print("{0:>9} {1:>10} {2:>12} {3:>13} {4:>9}".format("iteration", "RSS (MB)", "change (MB)", "gc objects",
+                                                         "time (s)"))
+
+    with tempfile.TemporaryDirectory() as output_directory:
+        first_rss = None
+        for iteration in range(1, args.iterations + 1):
+            config_obj = config.Config()
+            config_obj.outfile_path = os.path.join(output_directory, "")
+
+            start_time = time.time()
+            analyze_image(args.image, config_obj)
+            elapsed = time.time() - start_time
+
+            rss = get_rss()
+            if first_rss is None:
+                first_rss = rss
+
+            # Without an RSS reading, the object count is still a good sign of whether memory is freed
+            if rss is None:
+                rss_text = change_text = "n/a"
+            else:
+                rss_text = "{0:.1f}".format(rss / 2 ** 20)
+                change_text = "{0:+.1f}".format((rss - first_rss) / 2 ** 20)
+
+            print("{0:>9} {1:>10} {2:>12} {3:>13} {4:>9.2f}".format(
+                iteration, rss_text, change_text, len(gc.get_objects()), elapsed))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
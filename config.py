@@ -29,6 +29,16 @@ class Config:
     # higher values result in nodules only being found at rapidly-growing points
     # lower values result in more nodule detections but possibly more errors
     rad_multiplier = 1.5
+    # list of (abs_threshold_multiplier, min_threshold_multiplier, rad_multiplier) tuples to try alongside the values
+    # above, for tuning the thresholds without rerunning the analysis
+    # the nodule count and area found with each tuple are written to the log in a single extra pass
+    # by default, the sweep is empty
+    nodule_parameter_sweep = []
+    # method used to count nodules and measure their area, which both give the same results:
+    # "raster" draws every nodule onto a canvas the size of the image, which is quickest when there are many nodules
+    # "geometry" works out which nodules overlap from their centers and radii, which is quickest for a few nodules on a
+    # large image
+    nodule_counting_engine = "raster"
 
     # contains pair of (y,x) tuples representing the part of the image worth analyzing
     # y and x are stored as percentages of the image dimensions
@@ -50,7 +60,18 @@ class Config:
     # set this to false if you don't care about nodules
     search_for_nodules = True
 
+    # BATCH OPTIONS (only used by batch.py)
+    # start point for every image, stored as a (y,x) tuple of percentages of the image dimensions like a click in the UI
+    # it's moved to the nearest root pixel, so the default of top-center suits root systems that grow down the image
+    batch_seedYX = (0, 0.5)
+    # number of images to analyze at once (0 means one per CPU core)
+    batch_worker_count = 0
+
     # DEVELOPER OPTIONS
+    # method used to find the radius of the root at every pixel, which both give the same results:
+    # "distance_transform" finds them all in one pass, and "bfs" steps inward from the edges one layer at a time, which
+    # is slower on thick roots but follows the original method step by step
+    radius_engine = "distance_transform"
     # toggle to store whether the user wants to test radii calculation with test-printed images
     # you more than likely don't want this option
     test_radii = False
@@ -62,6 +83,9 @@ class Config:
     # do not edit these values - they're just enumerated here to track what's being stored in this class
     file_name = None
     file_extension = None
+    # name given to the output files and output row of the current image, which is file_name unless a batch run has
+    # several images with that name
+    output_name = None
 
     initial_image_path = None
     updated_image_path = None
@@ -2,7 +2,6 @@ import os
 from threading import Thread
 
 from PyQt5.QtCore import pyqtSignal, QObject
-from PIL import Image
 
 
 class Controller(QObject):
@@ -30,6 +29,17 @@ class Controller(QObject):
         QObject.__init__(self)
         self.config = config_obj
 
+    def attach_model(self, model_obj):
+        """
+        Starts relaying a Model's progress to the window. The model reports progress by calling plain functions, and
+        these are turned into Qt signals so that the window updates from its own thread.
+        :param model_obj: The Model to follow
+        :return: Nothing.
+        """
+        self.model = model_obj
+        self.model.log_listeners.append(self.signal_log_update)
+        self.model.image_listeners.append(self.signal_image_update)
+
     def signal_log_update(self):
         self.log_string = self.model.log_string
         self.log_update.emit()
@@ -112,15 +122,7 @@ class Controller(QObject):
     def load_next_file(self):
         self.window.reset_ui()
         if self.file_idx < len(self.file_set):
-            path = self.file_set[self.file_idx]
-            self.config.file_name = os.path.basename(path).split('.')[0]
-            self.config.file_extension = '.' + os.path.basename(path).split('.')[1]
-            self.config.infile_path = os.path.dirname(path)
-
-            self.config.initial_image_path = \
-                self.config.outfile_path + self.config.file_name + "-initial" + self.config.proper_file_extension
-            self.config.updated_image_path = \
-                self.config.outfile_path + self.config.file_name + "-analysis" + self.config.proper_file_extension
+            self.model.set_file_paths(self.file_set[self.file_idx])
 
             self.window.set_buttons_running()
 
@@ -146,54 +148,10 @@ class Controller(QObject):
         thread.start()
 
     def analyze(self):
-        # load the image file into an ArrayBuilder
-        self.model.load_image_to_array(self.config.initial_image_path)
-
-        # construct a graph and associated node_dict in a AreaBuilder
-        self.model.build_areas()
-
-        # print the initial representation of the output with a new Printer
-        self.model.print_background()
-
-        if self.config.test_radii:
-            self.model.print_test_radii()
-
-        # prune the initial representation down to a skeleton with a TreeBuilder
-        self.model.build_trees()
-
-        # reuse the Printer to print the skeleton representation of the output
-        self.model.print_skeleton()
-
-        # build root structures with a RootBuilder
-        self.model.build_roots()
-
-        # reuse the Printer to print a representation of the roots
-        self.model.print_roots()
-
-        # if the user selected it, search for nodules
-        if self.config.search_for_nodules:
-            self.model.find_nodules()
-
-            # and print them
-            self.model.print_nodules()
-
-        # complete!
-        self.model.display_final_data()
-
-        self.model.clean_up()
+        self.model.run_analysis()
 
         self.window.set_buttons_finished()
 
     def spawn_proper_infile(self):
-        initial_image = Image.open(
-            self.config.infile_path + "/" + self.config.file_name + self.config.file_extension).convert('RGB')
-        if initial_image.size[0] > initial_image.size[1]:
-            initial_image = initial_image.rotate(90)
-        initial_image.save(self.config.initial_image_path)
-        if 'dpi' in initial_image.info:
-            self.config.dpi = initial_image.info['dpi'][0]
+        self.model.spawn_proper_infile()
         self.signal_initial_draw()
-
-    def scale_config(self, scale_factor):
-        self.config.cm_per_pixel = 1/(470 * scale_factor)
-        self.config.seedYX = (scale_factor*self.config.seedYX[0]), (scale_factor*self.config.seedYX[1])
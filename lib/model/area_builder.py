@@ -1,82 +1,77 @@
-import lib.model.pixel as px
+from scipy import ndimage
+import numpy as np
 
+import lib.model.pixel_store as ps
 
-class AreaBuilder:
 
-    # Dictionary of the form {(int y, int x) : Pixel} that will hold the reconstruction areas
-    # WARNING: TreeBuilder makes a shallow copy of this pixel_dict, and changes to one affect the other. After the
-    # controller initializes TreeBuilder, this dictionary becomes unreliable.
-    pixel_dict = None
+class AreaBuilder:
 
-    def __init__(self):
-        self.pixel_dict = dict()
+    # PixelStore holding the radius, intensity and neighbor code of every location in the reconstruction areas
+    # WARNING: TreeBuilder and RootBuilder work on this same store, and changes made by one affect the others. After the
+    # controller initializes TreeBuilder, the store no longer holds the original areas.
+    pixel_store = None
 
     def load_pixels(self, image_array):
         """
-        Creates a pixel_dict from the output of an ArrayBuilder.
-        :param image_array: a 2D numpy array of values between 0 and 255 inclusive. Represents the black and white
-        filtered image created by an ArrayBuilder.
+        Creates a pixel_store from the output of an ArrayBuilder.
+        :param image_array: a 2D numpy array of non-negative intensities. Represents the black and white filtered image
+        created by an ArrayBuilder.
         :return: Nothing.
         """
-        for y in range(0, image_array.shape[0]):
-            for x in range(0, image_array.shape[1]):
-                if image_array[y][x]:
-                    self.pixel_dict[(y, x)] = px.Pixel(x, y, image_array[y][x])
+        self.pixel_store = ps.PixelStore(image_array)
 
-    def find_neighbors(self):
+    def set_radii(self, engine="distance_transform"):
         """
-        Calls search_in_direction for each pixel in the dictionary, to build the web of neighbor relationships
-        :return: Nothing.
+        Sets the radius of each pixel in the root structures. Any pixel that does not have 8 neighbors is touching black
+        space, so the maximum radius of a circle centered at the pixel and contained within the root is 0. It follows
+        that all pixels touching that pixel (the second layer inward) have radius 1, and so on and so forth. That is
+        exactly a chessboard distance transform of the mask, offset by one. Raises a ValueError if engine isn't
+        "distance_transform" or "bfs".
+        :param engine: "distance_transform" computes the radii in one pass with scipy, and "bfs" walks inward one layer
+        at a time like the original set-based search. Both give the same radii.
+        :return: The radius array, as a 2D view of the store's radii.
         """
-        for key in self.pixel_dict:
-            # If each pixel checks the same half of eight possible directions, they will tessellate to cover all
-            # possible edges. By convention, we choose to choose the 4 pixels that extend towards the southeast corner
-            # (that is, the locations immediately to the east, southeast, south, and southwest)
-            for delta in [(0, 1), (1, -1), (1, 0), (1, 1)]:
-                self.search_in_direction(key, delta)
+        if engine == "distance_transform":
+            radii = self.find_radii_by_distance_transform(self.pixel_store.get_mask())
+        elif engine == "bfs":
+            radii = self.find_radii_by_layers(self.pixel_store.get_mask())
+        else:
+            raise ValueError("Unknown radius engine {0!r}, expected \"distance_transform\" or \"bfs\"".format(engine))
 
-    def search_in_direction(self, pixel1_key, delta):
+        radius_array = self.pixel_store.get_radius_array()
+        radius_array[:] = radii
+
+        return radius_array
+
+    @staticmethod
+    def find_radii_by_distance_transform(mask):
         """
-        Checks to see if a given pixel has a neighbor in a given direction, and if so, sets them as neighbors.
-        :param pixel1_key: The (y,x) dictionary key of the start pixel
-        :param delta: The (y,x) change in location we're looking for a neighbor in (all values should be -1, 0, or 1)
-        :return: Nothing.
+        Finds the radius of every pixel with a chessboard distance transform.
+        :param mask: A 2D boolean array of the foreground.
+        :return: A 2D int array of the radius at every location, with -1 for background.
         """
-        # Build the dictionary key that a potential neighbor would have
-        pixel2_y = pixel1_key[0] + delta[0]
-        pixel2_x = pixel1_key[1] + delta[1]
-        pixel2_key = (pixel2_y, pixel2_x)
+        # Pad the mask with background so pixels on the image border are treated as touching black space
+        padded_mask = np.pad(mask, 1)
+        return ndimage.distance_transform_cdt(padded_mask, metric='chessboard')[1:-1, 1:-1] - 1
 
-        # Check to see if the prospective key actually exists
-        if pixel2_key in self.pixel_dict:
-            self.pixel_dict[pixel1_key].set_neighbors(self.pixel_dict[pixel2_key])
-
-    def set_radii(self):
+    @staticmethod
+    def find_radii_by_layers(mask):
         """
-        Iterates through the pixels of a root structure setting the radius of each pixel. It can be assumed that any
-        pixel that does not have 8 neighbors is touching black space and the maximum radius of a circle centered at the
-        pixel and contained within the root is 0. It follows that all pixels touching that pixel (the second layer
-        inward) have radius 1, and so on and so forth.
-        :return: Nothing
+        Finds the radius of every pixel by peeling the mask one layer at a time, starting from the pixels touching black
+        space. Each layer is the unassigned foreground touching the layer before it. This is much slower than the
+        distance transform on thick roots, which have many layers, but follows the original definition step by step.
+        :param mask: A 2D boolean array of the foreground.
+        :return: A 2D int array of the radius at every location, with -1 for background.
         """
-        # Find the initial set of pixels that touch black space
-        outermost_pixel_set = set()
-        for pixel in self.pixel_dict.values():
-            if None in pixel.neighbors:
-                outermost_pixel_set.add(pixel)
+        radii = np.full(mask.shape, -1, dtype=np.int64)
+        neighborhood = np.ones((3, 3), dtype=bool)
 
-        # Iteratively assign radii to sets of nodes, making new sets out of the union of the current set's neighbors
+        # Pixels outside the image count as black space, so border pixels are in the outermost layer
+        current_layer = mask & ~ndimage.binary_erosion(mask, structure=neighborhood, border_value=0)
         current_radius_value = 0
-        while outermost_pixel_set:
-            new_outermost_set = set()
-
-            for pixel in outermost_pixel_set:
-                pixel.radius = current_radius_value
-
-            for pixel in outermost_pixel_set:
-                for neighbor in pixel.neighbors:
-                    if neighbor and neighbor.radius is None:
-                        new_outermost_set.add(neighbor)
-
+        while current_layer.any():
+            radii[current_layer] = current_radius_value
+            current_layer = ndimage.binary_dilation(current_layer, structure=neighborhood) & mask & (radii < 0)
             current_radius_value += 1
-            outermost_pixel_set = new_outermost_set
+
+        return radii
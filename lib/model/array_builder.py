@@ -8,8 +8,13 @@ class ArrayBuilder:
     file_path = None
 
     # Stores the thresholded, filtered, and masked image data for delivery to another function
+    # After filter_array, this is a 2D uint32 array of grayscale intensities in thousandths (see grayscale_weights)
     array = None
 
+    # Weight of the red, green and blue channels in the grayscale intensity, in thousandths. Integer weights keep the
+    # grayscale values exact, so thresholding and filtering don't depend on floating point rounding
+    grayscale_weights = (299, 587, 144)
+
     # Stores the image for use in the UI
     UI_image = None
 
@@ -17,6 +22,14 @@ class ArrayBuilder:
     image_height = None
     image_width = None
 
+    # Dictionary of form {(int height, int width, whitelist, blacklist): 2D bool array} holding the masks built by
+    # mask_ruler. It's shared by every ArrayBuilder, since a new one is made for each image and the same areas are
+    # usually masked on image after image. The masks are stored read-only, so no caller can change them for the rest
+    area_mask_cache = dict()
+
+    # Maximum number of masks kept in area_mask_cache
+    area_mask_cache_size = 8
+
     def __init__(self, file_path):
         self.file_path = file_path
 
@@ -48,49 +61,76 @@ class ArrayBuilder:
             return (self.image_height, self.image_width), 1
 
     def filter_array(self, threshold_multiplier):
-        self.array = np.dot(self.array[..., :3], [0.299, 0.587, 0.144])
+        # Build the grayscale image one channel at a time, so the only full-size temporary is a single uint32 channel.
+        # Each channel is widened before it's weighted, since multiplying the uint8 channel directly can overflow
+        gray_array = np.zeros(self.array.shape[:2], dtype=np.uint32)
+        for channel, weight in enumerate(self.grayscale_weights):
+            gray_array += self.array[..., channel].astype(np.uint32) * weight
+        self.array = gray_array
 
         # Scale of the image mean intensity to threshold the image at (higher multipliers are less permissive)
         global_threshold = self.array.mean() * threshold_multiplier
         self.array[self.array < global_threshold] = 0
 
-        self.array = ndimage.filters.median_filter(self.array, size=(4, 4))
+        self.array = ndimage.median_filter(self.array, size=(4, 4))
 
     def mask_ruler(self, whitelist, blacklist):
+        """
+        Blacks out everything outside the whitelisted area and inside any blacklisted area.
+        :param whitelist: Pair of (y,x) tuples holding the corners of the area worth analyzing, as percentages of the
+        image dimensions
+        :param blacklist: List of pairs of (y,x) tuples holding the corners of areas to ignore, as percentages of the
+        image dimensions
+        :return: Nothing.
+        """
+        self.array *= self.get_area_mask(whitelist, blacklist)
 
+        self.UI_image = Image.fromarray(self.array, 'RGB')
+
+    def get_area_mask(self, whitelist, blacklist):
+        """
+        Gets the mask for this image's size, building it only if the same size, whitelist and blacklist haven't been
+        seen before. The masks are cached in area_mask_cache, which every ArrayBuilder shares.
+        :param whitelist: Pair of (y,x) tuples, as passed to mask_ruler
+        :param blacklist: List of pairs of (y,x) tuples, as passed to mask_ruler
+        :return: A read-only 2D boolean array that is True for the locations to keep. It's shared with every other
+        image of the same size, so copy it before making changes.
+        """
+        key = (self.image_height, self.image_width, tuple(map(tuple, whitelist)),
+               tuple(tuple(map(tuple, area)) for area in blacklist))
+
+        area_mask = self.area_mask_cache.get(key)
+        if area_mask is None:
+            area_mask = self.build_area_mask(whitelist, blacklist)
+            area_mask.setflags(write=False)
+
+            # Drop the oldest mask once the cache is full
+            if len(self.area_mask_cache) >= self.area_mask_cache_size:
+                del self.area_mask_cache[next(iter(self.area_mask_cache))]
+            self.area_mask_cache[key] = area_mask
+
+        return area_mask
+
+    def build_area_mask(self, whitelist, blacklist):
+        """
+        Builds a mask of the whitelisted area with the blacklisted areas removed.
+        :param whitelist: Pair of (y,x) tuples, as passed to mask_ruler
+        :param blacklist: List of pairs of (y,x) tuples, as passed to mask_ruler
+        :return: A 2D boolean array that is True for the locations to keep
+        """
         # Find the locations of the edges of the whitelisted area
-        left_margin = int(whitelist[0][1] * self.image_width)
-        right_margin = int(whitelist[1][1] * self.image_width)
-        top_margin = int(whitelist[0][0] * self.image_height)
-        bottom_margin = int(whitelist[1][1] * self.image_height)
-
-        # Left edge
-        for x in range(0, left_margin):
-            for y in range(0, self.image_height):
-                self.array[y, x] = 0
-
-        # Right edge
-        for x in range(right_margin, self.image_width):
-            for y in range(0, self.image_height):
-                self.array[y, x] = 0
-
-        # Top edge
-        for x in range(left_margin, right_margin):
-            for y in range(0, top_margin):
-                self.array[y, x] = 0
-
-        # Bottom edge
-        for x in range(left_margin, right_margin):
-            for y in range(bottom_margin, self.image_height):
-                self.array[y, x] = 0
+        left_margin = max(int(whitelist[0][1] * self.image_width), 0)
+        right_margin = max(int(whitelist[1][1] * self.image_width), 0)
+        top_margin = max(int(whitelist[0][0] * self.image_height), 0)
+        bottom_margin = max(int(whitelist[1][0] * self.image_height), 0)
+
+        area_mask = np.zeros((self.image_height, self.image_width), dtype=bool)
+        area_mask[top_margin:bottom_margin, left_margin:right_margin] = True
 
         # Blacklisted areas
         for area in blacklist:
             yrange = (abs(int(area[0][0] * self.image_height)), abs(int(area[1][0] * self.image_height)))
             xrange = (abs(int(area[0][1] * self.image_width)), abs(int(area[1][1] * self.image_width)))
-            for y in range(yrange[0], yrange[1]):
-                for x in range(xrange[0], xrange[1]):
-                    if x < self.array.shape[1] and y < self.array.shape[0]:
-                        self.array[y, x] = 0
+            area_mask[yrange[0]:yrange[1], xrange[0]:xrange[1]] = False
 
-        self.UI_image = Image.fromarray(self.array, 'RGB')
+        return area_mask
@@ -1,13 +1,20 @@
+import os
 import time
 import math
-from PyQt5.QtCore import pyqtSignal, QObject
 
-from lib.model import array_builder, area_builder, tree_builder, root_builder, nodule_finder
+from PIL import Image
+
+from lib.model import array_builder, area_builder, tree_builder, root_builder, nodule_finder, nodule_counter
 from lib.view import printer
 
 
-class Model(QObject):
-    controller = None
+class Model:
+    config = None
+
+    # Lists of functions, taking no arguments, to call whenever log_string or the preview image changes. This is how a
+    # UI follows the analysis, and the model runs the same with or without one
+    log_listeners = None
+    image_listeners = None
 
     array_builder = None
 
@@ -19,6 +26,11 @@ class Model(QObject):
 
     nodule_finder = None
 
+    # NoduleCounter used by the "geometry" nodule counting engine. It's made the first time an image's nodules are
+    # measured with that engine, and shared by the main count and every nodule_parameter_sweep entry, so the nodule
+    # footprints it draws are only drawn once
+    nodule_counter = None
+
     printer = None
 
     # Time objects for performance tracking
@@ -35,42 +47,121 @@ class Model(QObject):
 
     csv_out_string = None
 
-    log_string = None
+    # Copy of the printer's image taken at the last image update, for the UI to preview while the run continues
+    preview_image = None
 
-    log_update = pyqtSignal()
-    img_update = pyqtSignal()
+    log_string = None
 
-    def __init__(self, controller):
-        QObject.__init__(self)
-        self.controller = controller
-        self.log_update.connect(self.controller.signal_log_update)
-        self.img_update.connect(self.controller.signal_image_update)
+    def __init__(self, config_obj):
+        self.config = config_obj
+        self.log_listeners = list()
+        self.image_listeners = list()
 
     def signal_log_update(self):
-        self.log_update.emit()
+        for listener in self.log_listeners:
+            listener()
 
     def signal_image_update(self):
-        self.img_update.emit()
+        if self.image_listeners:
+            self.preview_image = self.printer.image.copy()
+        for listener in self.image_listeners:
+            listener()
+
+    def set_file_paths(self, path, output_name=None):
+        """
+        Points the config at a new input image and the output files generated from it.
+        :param path: The path to the input image
+        :param output_name: Optional name to give the output files and the output row. Defaults to the input file's name
+        without its extension.
+        :return: Nothing.
+        """
+        self.config.file_name, self.config.file_extension = os.path.splitext(os.path.basename(path))
+        self.config.infile_path = os.path.dirname(path)
+        self.config.output_name = output_name or self.config.file_name
+
+        self.config.initial_image_path = \
+            self.config.outfile_path + self.config.output_name + "-initial" + self.config.proper_file_extension
+        self.config.updated_image_path = \
+            self.config.outfile_path + self.config.output_name + "-analysis" + self.config.proper_file_extension
+
+    def spawn_proper_infile(self):
+        """
+        Converts the input image to an upright RGB copy at config.initial_image_path, which the analysis runs on, and
+        reads its DPI if the file has one.
+        :return: Nothing.
+        """
+        initial_image = Image.open(
+            os.path.join(self.config.infile_path, self.config.file_name + self.config.file_extension)).convert('RGB')
+        if initial_image.size[0] > initial_image.size[1]:
+            initial_image = initial_image.rotate(90)
+        initial_image.save(self.config.initial_image_path)
+        if 'dpi' in initial_image.info:
+            self.config.dpi = initial_image.info['dpi'][0]
+
+    def run_analysis(self):
+        """
+        Runs every stage of the analysis on the image at config.initial_image_path, starting from config.seedYX.
+        :return: Nothing. Upon successful completion, the analysis image has been saved to config.updated_image_path and
+        csv_out_string holds this image's row of output data.
+        """
+        # load the image file into an ArrayBuilder
+        self.load_image_to_array(self.config.initial_image_path)
+
+        # construct a graph and associated node_dict in a AreaBuilder
+        self.build_areas()
+
+        # print the initial representation of the output with a new Printer
+        self.print_background()
+
+        if self.config.test_radii:
+            self.print_test_radii()
+
+        # prune the initial representation down to a skeleton with a TreeBuilder
+        self.build_trees()
+
+        # reuse the Printer to print the skeleton representation of the output
+        self.print_skeleton()
+
+        # build root structures with a RootBuilder
+        self.build_roots()
+
+        # reuse the Printer to print a representation of the roots
+        self.print_roots()
+
+        # if the user selected it, search for nodules
+        if self.config.search_for_nodules:
+            self.find_nodules()
+
+            # and print them
+            self.print_nodules()
+
+        # write the finished image to disk
+        self.save_output_image()
+
+        # complete!
+        self.display_final_data()
+
+        self.clean_up()
 
     def load_image_to_array(self, file_path):
         self.start_time = time.time()
         self.last_time = time.time()
 
-        self.log_string = "Loading image {0}:".format(self.controller.config.file_name)
+        self.log_string = "Loading image {0}:".format(self.config.output_name)
         self.signal_log_update()
         self.array_builder = array_builder.ArrayBuilder(file_path)
 
-        shape, scaling = self.array_builder.load_to_array(self.controller.config.image_scaled_height)
-        self.controller.config.image_dimensions = shape
-        self.controller.scale_config(scaling)
+        shape, scaling = self.array_builder.load_to_array(self.config.image_scaled_height)
+        self.config.image_dimensions = shape
+        self.config.cm_per_pixel = 1/(470 * scaling)
         self.log_string += "\n- Loaded image to array in {0}".format(self.print_timestamp())
-        self.log_string += "\n   - Detected effective DPI of {0}".format(self.controller.config.dpi)
+        self.log_string += "\n   - Detected effective DPI of {0}".format(self.config.dpi)
         self.log_string += "\n   - Image size: {0}x{1}".format(self.array_builder.image_width,
                                                                self.array_builder.image_height)
         self.signal_log_update()
 
-        self.array_builder.filter_array(self.controller.config.threshold_multiplier)
-        self.array_builder.mask_ruler(self.controller.config.area_whitelist, self.controller.config.area_blacklist)
+        self.array_builder.filter_array(self.config.threshold_multiplier)
+        self.array_builder.mask_ruler(self.config.area_whitelist, self.config.area_blacklist)
         self.log_string += "\n- Filtered and masked array in {0}".format(self.print_timestamp())
         self.signal_log_update()
 
@@ -80,53 +171,49 @@ class Model(QObject):
         self.area_builder = area_builder.AreaBuilder()
 
         self.area_builder.load_pixels(self.array_builder.array)
-        self.log_string += "\n- Constructed pixel_dict in {0}".format(self.print_timestamp())
+        self.log_string += "\n- Constructed pixel_store in {0}".format(self.print_timestamp())
         self.log_string += "\n   - Total area found on first pass: {0} px.".format(
-            len(self.area_builder.pixel_dict))
+            self.area_builder.pixel_store.count())
         self.signal_log_update()
 
-        self.area_builder.find_neighbors()
-        self.log_string += "\n- Added neighbors in {0}".format(self.print_timestamp())
-        self.signal_log_update()
-
-        self.area_builder.set_radii()
+        self.area_builder.set_radii(self.config.radius_engine)
         self.log_string += "\n- Set radii in {0}".format(self.print_timestamp())
         self.signal_log_update()
 
     def print_background(self):
         """
         Function to print a faint background of the original image to a file for error checking.
-        :return: Nothing. Upon successful completion, printer.array contains the faint background to be drawn on later.
+        :return: Nothing. Upon successful completion, printer.image contains the faint background to be drawn on later.
         """
 
         self.log_string += "\n\nPrinting initial area's outline:"
         self.signal_log_update()
-        self.printer = printer.Printer(self.controller.config.updated_image_path,
+        self.printer = printer.Printer(self.config.updated_image_path,
                                        self.array_builder.array.shape)
 
-        self.printer.print_original_image(self.area_builder.pixel_dict)
+        self.printer.print_original_image(self.area_builder.pixel_store.get_mask())
         self.log_string += "\n- Printed gray outline in {0}".format(self.print_timestamp())
         self.signal_image_update()
         self.signal_log_update()
 
     def build_trees(self):
         """
-        Function to iteratively prune the pixels in pixel_dict until only a 1px-wide skeleton remains to represent the
+        Function to iteratively prune the pixels in pixel_store until only a 1px-wide skeleton remains to represent the
         original image. This skeleton has parent-child relationships set up already.
-        :return: Nothing. Upon successful completion, tree_builder.pixel_dict contains the skeleton and
+        :return: Nothing. Upon successful completion, tree_builder.pixel_store contains the skeleton and
         tree_builder.all_seed_pixels contains the starting points of each tree.
         """
 
         self.log_string += "\n\nPruning areas down to trees:"
         self.signal_log_update()
-        self.tree_builder = tree_builder.TreeBuilder(self.area_builder.pixel_dict)
+        self.tree_builder = tree_builder.TreeBuilder(self.area_builder.pixel_store)
 
-        seedY_loc = math.floor(self.controller.config.seedYX[0] * self.controller.config.image_dimensions[0])
-        seedX_loc = math.floor(self.controller.config.seedYX[1] * self.controller.config.image_dimensions[1])
+        seedY_loc = math.floor(self.config.seedYX[0] * self.config.image_dimensions[0])
+        seedX_loc = math.floor(self.config.seedYX[1] * self.config.image_dimensions[1])
 
-        self.controller.config.seedYX = (seedY_loc, seedX_loc)
+        self.config.seedYX = (seedY_loc, seedX_loc)
 
-        self.tree_builder.best_pixel = self.tree_builder.find_best_pixel(self.controller.config.seedYX)
+        self.tree_builder.best_pixel = self.tree_builder.find_best_pixel(self.config.seedYX)
         self.tree_builder.all_seed_pixels.add(self.tree_builder.best_pixel)
         self.log_string += "\n- Found best approximation for click point in {0}".format(
             self.print_timestamp())
@@ -134,22 +221,22 @@ class Model(QObject):
             self.tree_builder.best_pixel.x, self.tree_builder.best_pixel.y, self.tree_builder.best_pixel.radius)
         self.signal_log_update()
 
-        self.tree_builder.find_small_areas(self.controller.config.minimum_tree_size_multiplier *
-                                           self.controller.config.image_dimensions[0])
-        removal_count = self.tree_builder.previous_pixel_count - len(self.tree_builder.pixel_dict)
-        self.tree_builder.previous_pixel_count = len(self.tree_builder.pixel_dict)
+        self.tree_builder.find_small_areas(self.config.minimum_tree_size_multiplier *
+                                           self.config.image_dimensions[0])
+        removal_count = self.tree_builder.previous_pixel_count - self.tree_builder.pixel_store.count()
+        self.tree_builder.previous_pixel_count = self.tree_builder.pixel_store.count()
         removed_percentage = round(100 * (removal_count / self.tree_builder.initial_pixel_count), 1)
         self.log_string += "\n- Removed small areas in {0}".format(self.print_timestamp())
         self.log_string += "\n   - Total small area removed: {0} px ({1}% of original area)".format(
             removal_count, removed_percentage)
         self.signal_log_update()
 
-        self.total_area = float(len(self.tree_builder.pixel_dict)) * self.controller.config.cm_per_pixel ** 2 \
+        self.total_area = float(self.tree_builder.pixel_store.count()) * self.config.cm_per_pixel ** 2 \
             * ((1 + math.sqrt(2)) / 2)
 
         self.tree_builder.prune_redundant_pixels()
-        removal_count = self.tree_builder.previous_pixel_count - len(self.tree_builder.pixel_dict)
-        self.tree_builder.previous_pixel_count = len(self.tree_builder.pixel_dict)
+        removal_count = self.tree_builder.previous_pixel_count - self.tree_builder.pixel_store.count()
+        self.tree_builder.previous_pixel_count = self.tree_builder.pixel_store.count()
         removed_percentage = round(100 * (removal_count / self.tree_builder.initial_pixel_count), 1)
         self.log_string += "\n- Removed redundant areas in {0}".format(self.print_timestamp())
         self.log_string += "\n   - Total redundant area removed: {0} px ({1}% of original area)".format(
@@ -163,8 +250,8 @@ class Model(QObject):
         self.signal_log_update()
 
         self.tree_builder.remove_right_angles()
-        removal_count = self.tree_builder.previous_pixel_count - len(self.tree_builder.pixel_dict)
-        self.tree_builder.previous_pixel_count = len(self.tree_builder.pixel_dict)
+        removal_count = self.tree_builder.previous_pixel_count - self.tree_builder.pixel_store.count()
+        self.tree_builder.previous_pixel_count = self.tree_builder.pixel_store.count()
         removed_percentage = round(100 * (removal_count / self.tree_builder.initial_pixel_count), 1)
         self.log_string += "\n- Removed inefficient right-angle connections in {0}".format(
             self.print_timestamp())
@@ -172,7 +259,7 @@ class Model(QObject):
             removal_count, removed_percentage)
         self.signal_log_update()
 
-        compression_percentage = round(100 * (1 - len(self.tree_builder.pixel_dict) /
+        compression_percentage = round(100 * (1 - self.tree_builder.pixel_store.count() /
                                               self.tree_builder.initial_pixel_count), 1)
         self.log_string += "\n- Total pixels in final area representation: {0}".format(
             self.tree_builder.previous_pixel_count)
@@ -188,7 +275,7 @@ class Model(QObject):
 
         self.log_string += "\n\nPrinting skeleton onto gray outline:"
         self.signal_log_update()
-        self.printer.print_skeletal_outline(self.tree_builder.all_seed_pixels)
+        self.printer.print_skeletal_outline(self.tree_builder.get_tree_levels())
         self.log_string += "\n   - Printed skeletal outline in {0}".format(self.print_timestamp())
         self.signal_image_update()
         self.signal_log_update()
@@ -197,24 +284,24 @@ class Model(QObject):
 
         self.log_string += "\n\nPrinting test radii:"
         self.signal_log_update()
-        testcase_count = self.controller.config.testcase_count
-        file_name = self.controller.config.testcase_count
-        self.printer.print_test_radii(testcase_count, file_name, self.area_builder.pixel_dict)
+        testcase_count = self.config.testcase_count
+        file_name = self.config.testcase_count
+        self.printer.print_test_radii(testcase_count, file_name, self.area_builder.pixel_store)
         self.log_string += "\n   - Printed {0} test cases in {1}".format(testcase_count,
                                                                          self.print_timestamp())
         self.signal_log_update()
 
     def build_roots(self):
         """
-        Function to build a series of Root objects to represent the trees in a pixel_dict. It creates the roots, removes
-        short invalid roots, and untangles them by correctly combining them into longer roots.
+        Function to build a series of Root objects to represent the trees in a pixel_store. It creates the roots,
+        removes short invalid roots, and untangles them by correctly combining them into longer roots.
         :return: Nothing. Upon successful completion, root_builder.root_dict contains all the roots, and
         root_builder.all_seed_roots contains the start points to use them.
         """
 
         self.log_string += "\n\nBuilding root structures:"
         self.signal_log_update()
-        self.root_builder = root_builder.RootBuilder(self.tree_builder.pixel_dict, self.tree_builder.all_seed_pixels)
+        self.root_builder = root_builder.RootBuilder(self.tree_builder.pixel_store, self.tree_builder.all_seed_pixels)
 
         self.root_builder.create_initial_roots()
         initial_root_count = len(self.root_builder.root_dict)
@@ -246,7 +333,8 @@ class Model(QObject):
         self.log_string += "\n   - Final root count: {0}".format(len(self.root_builder.root_dict))
         self.signal_log_update()
 
-        self.root_builder.update_root_statistics_and_totals()
+        # Root.combine keeps each root's statistics current, so only the totals need recalculating
+        self.root_builder.update_only_total_statistics()
         self.log_string += "\n- Calculated final root average radii and total lengths in {0}".format(
             self.print_timestamp())
         self.log_string += "\n   - Final total root length: {0} px.".format(
@@ -255,7 +343,7 @@ class Model(QObject):
             round(self.root_builder.average_radius, 1))
         self.signal_log_update()
 
-        cm_per_pixel = self.controller.config.cm_per_pixel
+        cm_per_pixel = self.config.cm_per_pixel
         self.log_string += "\n- Final statistics:"
         self.log_string += "\n   - Total root length: {0} cm.".format(
             round(self.root_builder.total_root_length * cm_per_pixel, 2))
@@ -285,26 +373,53 @@ class Model(QObject):
                                                         self.root_builder.total_root_length,
                                                         self.root_builder.average_radius)
 
-        multipliers = (self.controller.config.abs_threshold_multiplier, self.controller.config.min_threshold_multiplier, self.controller.config.rad_multiplier)
+        multipliers = (self.config.abs_threshold_multiplier, self.config.min_threshold_multiplier,
+                       self.config.rad_multiplier)
         self.nodule_finder.find_by_windows(multipliers)
         self.log_string += "\n   - Completed threshold-based search in {0}".format(
             self.print_timestamp())
         self.signal_log_update()
 
-        self.nodule_count = self.printer.count_nodules(self.nodule_finder.nodule_set)
+        self.nodule_count, nodule_area_px = self.measure_nodules(self.nodule_finder.nodule_set)
         self.log_string += "\n   - Counted nodules in {0}".format(self.print_timestamp())
         self.signal_log_update()
         self.log_string += "\n   - Nodules found: {0}".format(self.nodule_count)
         self.signal_log_update()
 
-        nodule_area_px = self.printer.count_white_px(self.nodule_finder.nodule_set) * ((1 + math.sqrt(2)) / 2)
-        self.nodule_area = nodule_area_px * self.controller.config.cm_per_pixel**2
-        self.log_string += "\n   - Computed nodule area (hacky solution) in {0}".format(
-            self.print_timestamp())
-        self.signal_log_update()
+        self.nodule_area = nodule_area_px * ((1 + math.sqrt(2)) / 2) * self.config.cm_per_pixel**2
         self.log_string += "\n   - Estimated nodule area: {0} cm^2".format(round(self.nodule_area, 2))
         self.signal_log_update()
 
+        if self.config.nodule_parameter_sweep:
+            multiplier_grid = [tuple(multipliers) for multipliers in self.config.nodule_parameter_sweep]
+            nodule_sets = self.nodule_finder.sweep_by_windows(multiplier_grid)
+            self.log_string += "\n   - Completed threshold parameter sweep in {0}".format(self.print_timestamp())
+            for multipliers, nodule_set in zip(multiplier_grid, nodule_sets):
+                sweep_count, sweep_area_px = self.measure_nodules(nodule_set)
+                sweep_area = sweep_area_px * ((1 + math.sqrt(2)) / 2) * self.config.cm_per_pixel**2
+                self.log_string += "\n      - Multipliers {0}: {1} nodules, {2} cm^2".format(
+                    multipliers, sweep_count, round(sweep_area, 2))
+            self.signal_log_update()
+
+    def measure_nodules(self, nodule_set):
+        """
+        Counts the separate nodules in a set of nodule pixels and measures their area, using the engine chosen in the
+        config. Raises a ValueError if config.nodule_counting_engine isn't "raster" or "geometry".
+        :param nodule_set: A set of Pixel objects representing nodule locations
+        :return: Tuple of form (int count, int area in px as given by Printer.count_white_px)
+        """
+        if self.config.nodule_counting_engine == "geometry":
+            if self.nodule_counter is None:
+                self.nodule_counter = nodule_counter.NoduleCounter(self.printer.image_height, self.printer.image_width)
+            return self.nodule_counter.measure_nodules(nodule_set)
+
+        if self.config.nodule_counting_engine == "raster":
+            nodule_mask = self.printer.rasterize_nodules(nodule_set)
+            return self.printer.count_nodules(nodule_mask), self.printer.count_white_px(nodule_mask)
+
+        raise ValueError("Unknown nodule_counting_engine {0!r}, expected \"raster\" or \"geometry\"".format(
+            self.config.nodule_counting_engine))
+
     def print_nodules(self):
 
         self.log_string += "\n\nPrinting nodule view:"
@@ -314,6 +429,15 @@ class Model(QObject):
         self.signal_image_update()
         self.signal_log_update()
 
+    def save_output_image(self):
+        """
+        Writes the finished analysis image to disk, once all of the printing is done.
+        :return: Nothing. Upon successful completion, the image can be found at config.updated_image_path.
+        """
+        self.printer.save_image()
+        self.log_string += "\n\nSaved analysis image in {0}".format(self.print_timestamp())
+        self.signal_log_update()
+
     def display_final_data(self):
         self.log_string += "\n\n#   Program complete! Total runtime: {0}".format(
             self.print_total_time())
@@ -325,26 +449,31 @@ class Model(QObject):
         self.log_string += "\n#   - Measured total length: {0} cm".format(round(self.total_length, 4))
         self.log_string += "\n#   - Deviation from expected length: {0}%".format(
             round(100 * ((self.total_length - self.expected_length) / self.total_length), 2))
-        if self.controller.config.search_for_nodules:
+        if self.config.search_for_nodules:
             self.log_string += "\n#   - Measured total nodule area: {0} cm2".format(
                 round(self.nodule_area, 4))
             self.log_string += "\n#   - Nodule count: {0}".format(self.nodule_count)
 
-        self.csv_out_string = "\n{0},{1},{2},{3}".format(self.controller.config.file_name, round(self.total_length, 4),
+        self.csv_out_string = "\n{0},{1},{2},{3}".format(self.config.output_name, round(self.total_length, 4),
                                                     round(self.calculated_average_diameter, 4),
                                                     round(self.total_area, 4))
-        if self.controller.config.search_for_nodules:
+        if self.config.search_for_nodules:
             self.csv_out_string += ",{0},{1}".format(self.nodule_count, round(self.nodule_area, 4))
 
         self.signal_log_update()
 
     def clean_up(self):
-        del self.array_builder
-        del self.area_builder
-        del self.tree_builder
-        del self.root_builder
-        del self.nodule_finder
-        del self.printer
+        # Roots link to each other in both directions, so break those links before letting go of them
+        if self.root_builder:
+            self.root_builder.clear_roots()
+
+        self.array_builder = None
+        self.area_builder = None
+        self.tree_builder = None
+        self.root_builder = None
+        self.nodule_finder = None
+        self.nodule_counter = None
+        self.printer = None
 
         self.start_time = None
         self.last_time = None
@@ -356,6 +485,8 @@ class Model(QObject):
         self.nodule_area = None
         self.nodule_count = None
 
+        self.preview_image = None
+
     def print_timestamp(self):
         """
         Creates a representation of the time since the last time this function was called
@@ -0,0 +1,138 @@
+from PIL import Image, ImageDraw
+from scipy import ndimage, spatial
+from scipy.sparse import csgraph, coo_matrix
+import numpy as np
+
+
+class NoduleCounter:
+
+    # Size of the image the nodules were found in. Nodule circles are clipped to it, as they are when drawn
+    image_height = None
+    image_width = None
+
+    # Dictionary of form {int radius: 2D bool array} holding the drawn footprint of a nodule circle of that radius,
+    # centered in a (2 * radius + 1) square
+    footprint_dict = None
+
+    def __init__(self, image_height, image_width):
+        self.image_height = image_height
+        self.image_width = image_width
+        self.footprint_dict = dict()
+
+    def measure_nodules(self, nodule_set):
+        """
+        Counts the separate nodules in a set of nodule pixels and measures their area, without drawing them onto a
+        canvas the size of the image. Gives the same results as Printer.rasterize_nodules followed by
+        Printer.count_nodules and Printer.count_white_px, but the work scales with the number of nodule pixels rather
+        than with the image size.
+        :param nodule_set: A set of Pixel objects representing nodule locations
+        :return: Tuple of form (int count, int area), where area is on the same scale as Printer.count_white_px
+        """
+        if not nodule_set:
+            return 0, 0
+
+        nodule_array = np.array([(pixel.y, pixel.x, pixel.radius) for pixel in nodule_set], dtype=np.int64)
+        nodule_count = len(nodule_array)
+        for radius in np.unique(nodule_array[:, 2]).tolist():
+            self.build_footprint(radius)
+
+        # Two circles can only touch if their centers are within the sum of their radii plus one in both directions, so
+        # the KD-tree only has to return pairs within twice the largest radius plus one
+        pixel_tree = spatial.cKDTree(nodule_array[:, :2])
+        pairs = pixel_tree.query_pairs(2 * nodule_array[:, 2].max() + 1, p=np.inf, output_type='ndarray')
+        pairs = pairs[np.abs(nodule_array[pairs[:, 0], :2] - nodule_array[pairs[:, 1], :2]).max(axis=1) <=
+                      nodule_array[pairs[:, 0], 2] + nodule_array[pairs[:, 1], 2] + 1]
+        touching = [self.check_if_touching(nodule_array[first], nodule_array[second]) for first, second in pairs]
+        pairs = pairs[np.array(touching, dtype=bool).reshape(-1)]
+
+        # Merge touching circles into nodules
+        adjacency = coo_matrix((np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])),
+                               shape=(nodule_count, nodule_count))
+        cluster_count, cluster_labels = csgraph.connected_components(adjacency, directed=False)
+
+        # Measure each nodule by drawing its circles into a canvas covering only that nodule. Circles that fall
+        # entirely off the image aren't drawn, so a nodule made only of those doesn't count
+        visible_count = 0
+        total_area = 0
+        order = np.argsort(cluster_labels, kind='stable')
+        cluster_starts = np.flatnonzero(np.diff(cluster_labels[order])) + 1
+        for cluster in np.split(nodule_array[order], cluster_starts):
+            top = max(int((cluster[:, 0] - cluster[:, 2]).min()), 0)
+            left = max(int((cluster[:, 1] - cluster[:, 2]).min()), 0)
+            bottom = min(int((cluster[:, 0] + cluster[:, 2]).max()) + 1, self.image_height)
+            right = min(int((cluster[:, 1] + cluster[:, 2]).max()) + 1, self.image_width)
+            if bottom <= top or right <= left:
+                continue
+
+            canvas = np.zeros((bottom - top, right - left), dtype=bool)
+            for y, x, radius in cluster.tolist():
+                self.paste(canvas, self.footprint_dict[radius], y - radius - top, x - radius - left)
+
+            cluster_area = np.count_nonzero(canvas)
+            if cluster_area:
+                visible_count += 1
+                total_area += cluster_area
+
+        # See Printer.count_white_px for the factor of 3
+        return visible_count, 3 * total_area
+
+    def build_footprint(self, radius):
+        """
+        Draws the footprint of a nodule circle of the given radius exactly as Printer.rasterize_nodules would.
+        :param radius: The non-negative int radius of the circle
+        :return: Nothing.
+        """
+        if radius in self.footprint_dict:
+            return
+
+        image = Image.new('L', (2 * radius + 1, 2 * radius + 1))
+        ImageDraw.Draw(image).ellipse((0, 0, 2 * radius, 2 * radius), 255, 255)
+        self.footprint_dict[radius] = np.array(image) > 0
+
+    def check_if_touching(self, first, second):
+        """
+        Checks whether two nodule circles would overlap or touch (including diagonally) once drawn onto the image.
+        :param first: Array of form [y, x, radius] for the first circle
+        :param second: Array of form [y, x, radius] for the second circle
+        :return: True if the drawn circles are connected, and False otherwise
+        """
+        first_y, first_x, first_radius = first.tolist()
+        second_y, second_x, second_radius = second.tolist()
+
+        # Any touching pixels lie within 1 pixel of both circles' bounding boxes. Only the parts of the circles that
+        # land on the image are drawn, so that's all that can touch
+        top = max(first_y - first_radius - 1, second_y - second_radius - 1, 0)
+        left = max(first_x - first_radius - 1, second_x - second_radius - 1, 0)
+        bottom = min(first_y + first_radius + 2, second_y + second_radius + 2, self.image_height)
+        right = min(first_x + first_radius + 2, second_x + second_radius + 2, self.image_width)
+        if bottom <= top or right <= left:
+            return False
+
+        first_canvas = np.zeros((bottom - top, right - left), dtype=bool)
+        second_canvas = np.zeros((bottom - top, right - left), dtype=bool)
+        self.paste(first_canvas, self.footprint_dict[first_radius], first_y - first_radius - top,
+                   first_x - first_radius - left)
+        self.paste(second_canvas, self.footprint_dict[second_radius], second_y - second_radius - top,
+                   second_x - second_radius - left)
+
+        first_reach = ndimage.binary_dilation(first_canvas, structure=np.ones((3, 3), dtype=bool))
+        return bool((first_reach & second_canvas).any())
+
+    @staticmethod
+    def paste(canvas, footprint, top, left):
+        """
+        Adds a footprint to a canvas, dropping any part of it that falls outside the canvas.
+        :param canvas: 2D bool array to draw onto
+        :param footprint: 2D bool array to draw
+        :param top: Row of the canvas where the footprint's first row goes (may be negative)
+        :param left: Column of the canvas where the footprint's first column goes (may be negative)
+        :return: Nothing.
+        """
+        canvas_top, canvas_left = max(top, 0), max(left, 0)
+        canvas_bottom = min(top + footprint.shape[0], canvas.shape[0])
+        canvas_right = min(left + footprint.shape[1], canvas.shape[1])
+        if canvas_bottom <= canvas_top or canvas_right <= canvas_left:
+            return
+
+        canvas[canvas_top:canvas_bottom, canvas_left:canvas_right] |= \
+            footprint[canvas_top - top:canvas_bottom - top, canvas_left - left:canvas_right - left]
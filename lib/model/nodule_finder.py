@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class NoduleFinder:
 
     # Dictionary of form (ID: Root) containing all Roots that represent the image
@@ -27,87 +30,74 @@ class NoduleFinder:
         self.nodule_set = set()
 
     def find_by_windows(self, multipliers):
-
-        # start from seed points
-        for seed_root in self.all_seed_roots:
-
-            empty_list = list()
-            # send that pixel set to an instance of window_search
-            self.window_search(seed_root, empty_list, multipliers)
-
-    def window_search(self, root, recent_pixels, multipliers):
-
-        absolute_threshold_multipler = multipliers[0]
-        min_threshold_multipler = multipliers[1]
-        radius_multiplier = multipliers[2]
-
-        starter_pixels = list()
-        branching_dict = dict()
-        pixel_idx = 0
-        target_length = int(self.total_length/550)
-        absolute_threshold = int(absolute_threshold_multipler*self.average_radius)
-        min_local_threshold = int(min_threshold_multipler*self.average_radius)
-
-        # Make deep copy so multiple branches don't overwrite each other
-        for pixel in recent_pixels:
-            starter_pixels.append(pixel)
-
-        # Generate dict of branch indices
-        for branch in root.branch_list:
-            if branch[0] in branching_dict:
-                branching_dict[branch[0]].append(branch[1])
-            else:
-                branching_dict[branch[0]]=[branch[1]]
-
-        # construct and iterate over a n pixel window (start with 10? a number dependent on the root length? higher numbers will yield more positives)
-
-        total_radius = 0
-        for n in starter_pixels:
-            total_radius += n.radius
-
-        # at branch points where the branch has length of at least z , spin off a new function and feed it the most recent n-1 radii
-        # track the current total radius and a list of radii that match the window for efficient recalculation
-        # pop the oldest pixel, add a new one to the other end, then check the status of the pixel at index n/2
-        # when a pixel is more than m times the average radius of the window, flag it (start with 2? lower numbers will yield more positives)
-        # when x out of y pixels are flagged, declare a nodule at all of them (including any unflagged) (start with 4/5? lower numbers will yield more positives)
-
-        recent_nodules = [False, False, False]
-
-        while pixel_idx < len(root.pixel_list):
-
-            # pop the first/oldest element from the window if the window has ramped up to the correct length
-            if starter_pixels and len(starter_pixels) >= target_length:
-                outgoing = starter_pixels.pop(0)
-                total_radius -= outgoing.radius
-
-            # append a new pixel to the end
-            starter_pixels.append(root.pixel_list[pixel_idx])
-            total_radius += root.pixel_list[pixel_idx].radius
-
-            branched = False
-            # check if you should branch here
-            if pixel_idx in branching_dict:
-                for out_root in branching_dict[pixel_idx]:
-                    if len(out_root.pixel_list) > 2:
-                        branched = True
-                        self.window_search(out_root, recent_pixels, multipliers)
-
-            # check if this is nodule-like
-            average_radius = total_radius/len(starter_pixels)
-            local_threshold = max(radius_multiplier*average_radius, min_local_threshold)
-            if starter_pixels[-1].radius > local_threshold and not branched:
-                if False not in recent_nodules:
-                    self.nodule_set.add(starter_pixels[-1])
-                recent_nodules.pop(0)
-                recent_nodules.append(True)
-            elif starter_pixels[-1].radius > absolute_threshold:
-                if False not in recent_nodules:
-                    self.nodule_set.add(starter_pixels[-1])
-                recent_nodules.pop(0)
-                recent_nodules.append(True)
-            else:
-                recent_nodules.pop(0)
-                recent_nodules.append(False)
-
-            # next iteration
-            pixel_idx += 1
\ No newline at end of file
+        """
+        Searches every root reachable from the seed roots for nodules, adding the nodule pixels found to nodule_set.
+        :param multipliers: Tuple of form (absolute threshold multiplier, minimum threshold multiplier, radius
+        multiplier), each scaled by the overall average radius (see config).
+        :return: Nothing.
+        """
+        self.nodule_set.update(self.sweep_by_windows([multipliers])[0])
+
+    def sweep_by_windows(self, multiplier_grid):
+        """
+        Runs the nodule search for several sets of thresholds in one pass over the roots. The radius windows don't
+        depend on the thresholds, so each root's windows are only built once. Roots are searched one at a time from a
+        stack, so deep branching doesn't run into the recursion limit.
+        :param multiplier_grid: List of multiplier tuples, each of the form taken by find_by_windows.
+        :return: A list holding the set of nodule Pixels found with each multiplier tuple, in the same order.
+        """
+        nodule_sets = [set() for _ in multiplier_grid]
+        multiplier_array = np.array(multiplier_grid, dtype=np.float64).reshape(-1, 3)
+
+        root_stack = list(self.all_seed_roots)
+        while root_stack:
+            root_stack.extend(self.window_search(root_stack.pop(), multiplier_array, nodule_sets))
+
+        return nodule_sets
+
+    def window_search(self, root, multiplier_array, nodule_sets):
+        """
+        Slides a window along a single root, flagging pixels whose radius is large compared to the window's average
+        radius or to the overall average radius. A pixel is declared a nodule when it and the 3 pixels before it are
+        all flagged.
+        :param root: The Root to search. Its window starts out empty.
+        :param multiplier_array: 2D float array with one row of multipliers for each set of thresholds, in the order
+        taken by find_by_windows.
+        :param nodule_sets: List with one set per row of multiplier_array, which the nodule Pixels found are added to.
+        :return: A list of the roots branching off this one that are long enough to be searched themselves.
+        """
+        # Thresholds are laid out as columns, so they broadcast against the pixels of the root
+        absolute_thresholds = np.trunc(multiplier_array[:, 0:1]*self.average_radius)
+        min_local_thresholds = np.trunc(multiplier_array[:, 1:2]*self.average_radius)
+        radius_multipliers = multiplier_array[:, 2:3]
+        target_length = max(int(self.total_length/550), 1)
+
+        pixel_list = root.pixel_list
+        pixel_count = len(pixel_list)
+        radii = np.array([pixel.radius for pixel in pixel_list], dtype=np.int64)
+
+        # Only branches longer than 2 pixels are searched, and a pixel where one leaves can't pass the local threshold
+        next_roots = list()
+        branched = np.zeros(pixel_count, dtype=bool)
+        for branch_location, branch in root.branch_dict.values():
+            if 0 <= branch_location < pixel_count and branch.pixel_count > 2:
+                branched[branch_location] = True
+                next_roots.append(branch)
+
+        # The window ramps up to target_length pixels and then slides, so its average comes from a cumulative sum
+        radius_sums = np.concatenate(([0], np.cumsum(radii)))
+        window_ends = np.arange(1, pixel_count + 1)
+        window_lengths = np.minimum(window_ends, target_length)
+        average_radii = (radius_sums[window_ends] - radius_sums[window_ends - window_lengths]) / window_lengths
+        local_thresholds = np.maximum(radius_multipliers*average_radii, min_local_thresholds)
+
+        flagged = ((radii > local_thresholds) & ~branched) | (radii > absolute_thresholds)
+
+        # Look for runs of 4 flags in a row, with the 3 flags before the start of the root counting as unflagged
+        padded_flags = np.pad(flagged, ((0, 0), (3, 0)))
+        is_nodule = flagged & padded_flags[:, :-3] & padded_flags[:, 1:-2] & padded_flags[:, 2:-1]
+
+        for nodule_set, nodule_indices in zip(nodule_sets, is_nodule):
+            nodule_set.update(pixel_list[i] for i in np.flatnonzero(nodule_indices).tolist())
+
+        return next_roots
@@ -0,0 +1,112 @@
+import numpy as np
+
+import lib.model.pixel as px
+
+
+class PixelStore:
+
+    # Size of the image the store covers. Every array below is flat, and the location (y, x) is at index y * width + x
+    height = None
+    width = None
+
+    # Flat boolean array that is True for every location that still holds a pixel. Pixels are removed by clearing it
+    alive = None
+
+    # Flat int32 array of the radius at every location, with -1 marking background
+    radius = None
+
+    # Flat array of the filtered image intensities, as delivered by ArrayBuilder
+    intensity = None
+
+    # Flat uint8 array holding an 8-bit neighbor code for every location. Bit i is set when the pixel had a neighbor in
+    # position i (see Pixel.neighbor_offsets) the last time update_neighbor_codes was called
+    neighbor_codes = None
+
+    # Flat int32 array of the flat index of each pixel's parent, or -1 for pixels without one
+    parent = None
+
+    # Dictionary of form {int index: Pixel} holding the Pixel objects handed out by get_pixel, so each location is
+    # always represented by the same object. Only the pixels that are asked for are ever created
+    pixel_cache = None
+
+    def __init__(self, image_array):
+        """
+        Creates a store holding every foreground location of an image
+        :param image_array: a 2D numpy array of non-negative intensities, where 0 is background
+        """
+        self.height, self.width = image_array.shape
+        self.intensity = np.ravel(image_array)
+        self.alive = self.intensity != 0
+        self.radius = np.full(self.alive.size, -1, dtype=np.int32)
+        self.neighbor_codes = np.zeros(self.alive.size, dtype=np.uint8)
+        self.parent = np.full(self.alive.size, -1, dtype=np.int32)
+        self.pixel_cache = dict()
+
+    def get_mask(self):
+        """
+        Gets the alive flags laid out as an image. Writing to the result changes the store.
+        :return: A 2D boolean view of alive
+        """
+        return self.alive.reshape(self.height, self.width)
+
+    def get_radius_array(self):
+        """
+        Gets the radii laid out as an image. Writing to the result changes the store.
+        :return: A 2D int32 view of radius
+        """
+        return self.radius.reshape(self.height, self.width)
+
+    def get_intensity_array(self):
+        """
+        Gets the intensities laid out as an image.
+        :return: A 2D view of intensity
+        """
+        return self.intensity.reshape(self.height, self.width)
+
+    def count(self):
+        """
+        Counts the pixels that are still alive.
+        :return: The number of pixels in the store
+        """
+        return int(np.count_nonzero(self.alive))
+
+    def update_neighbor_codes(self):
+        """
+        Recomputes the neighbor code of every location from the current alive flags.
+        :return: Nothing.
+        """
+        self.neighbor_codes = self.build_neighbor_codes(self.get_mask()).ravel()
+
+    def get_pixel(self, index):
+        """
+        Gets the Pixel object representing a location, creating it the first time it's asked for.
+        :param index: The flat index (y * width + x) of the location
+        :return: The Pixel object at that location
+        """
+        pixel = self.pixel_cache.get(index)
+
+        if pixel is None:
+            y, x = divmod(index, self.width)
+            pixel = px.Pixel(x, y, int(self.radius[index]))
+            self.pixel_cache[index] = pixel
+
+        return pixel
+
+    @staticmethod
+    def build_neighbor_codes(mask):
+        """
+        Computes the 8-neighborhood of every location in a mask using shifted copies of the mask.
+        :param mask: A 2D boolean array marking foreground locations.
+        :return: A 2D uint8 array of the same shape as mask. Bit i of each value is set when that location and its
+        neighbor in position i are both foreground. Locations outside the image count as background.
+        """
+        height, width = mask.shape
+        padded = np.zeros((height + 2, width + 2), dtype=bool)
+        padded[1:-1, 1:-1] = mask
+
+        codes = np.zeros((height, width), dtype=np.uint8)
+        for location, (delta_y, delta_x) in enumerate(px.Pixel.neighbor_offsets):
+            shifted = padded[1 + delta_y:height + 1 + delta_y, 1 + delta_x:width + 1 + delta_x]
+            codes |= (shifted & mask).astype(np.uint8) << location
+
+        return codes
@@ -9,106 +9,103 @@
 
 import math
 
+import numpy as np
+
 
 class Root:
-    key = None
+    # Instance attributes are slotted, so a Root doesn't carry a __dict__
+    __slots__ = (
+        'key',
+
+        # List of pixel lists that make up this root in order. Combining roots only links their segments together, and
+        # the segments are joined into one the first time pixel_list is read
+        'segment_list',
 
-    pixel_list = None
+        # List of 2D int64 arrays with one (y, x, radius) row per pixel, matching segment_list segment for segment. Like
+        # the pixels, the segments are joined the first time coordinate_array is read. RootBuilder fills this in for
+        # the roots it traces, and it's None until then
+        'coordinate_segment_list',
 
-    parent_root = None
+        # Total number of pixels across segment_list
+        'pixel_count',
 
-    branch_list = None
+        'parent_root',
 
-    branches_at_endpoint = None
+        # Dictionary of form {Root child: (int branch location, Root child)}, keyed by identity so a branch can be found
+        # or removed without scanning. Iterate over its values for the branch tuples in the order they were attached
+        'branch_dict',
 
-    total_length = None
+        # Dictionary of form {Root child: Root child} holding the branches that start at this root's last pixel, keyed
+        # by identity in the same way as branch_dict. Iterating over it gives the branches in the order they were
+        # attached
+        'branches_at_endpoint',
 
-    average_radius = None
+        'total_length',
 
-    remaining_length = None
+        'average_radius',
+
+        'remaining_length',
+    )
 
     def __init__(self, pixel_list, key):
-        self.pixel_list = pixel_list
-        self.branch_list = list()
-        self.branches_at_endpoint = list()
+        self.segment_list = [pixel_list]
+        self.coordinate_segment_list = None
+        self.pixel_count = len(pixel_list)
+        self.branch_dict = dict()
+        self.branches_at_endpoint = dict()
         self.key = key
+        self.parent_root = None
+        self.total_length = None
+        self.average_radius = None
+        self.remaining_length = None
 
     def __repr__(self):
         return "root " + str(self.key)
 
-    def calculate_root_statistics(self):
+    @property
+    def pixel_list(self):
         """
-        Calculates the total length and average radius for this root
-        :return: Nothing.
+        Gets every pixel in this root as one list, joining the segments first if there is more than one.
+        :return: A list of Pixel objects, from the start of the root to its end
         """
-        total_length = 0
-        total_radius = 0
-
-        for i in range(len(self.pixel_list)):
+        if len(self.segment_list) > 1:
+            self.segment_list = [[pixel for segment in self.segment_list for pixel in segment]]
 
-            total_radius += self.pixel_list[i].radius + 0.5
+        return self.segment_list[0]
 
-            if i > 0:
-                # Use the distance formula
-                delta_x = self.pixel_list[i].x - self.pixel_list[i - 1].x
-                delta_y = self.pixel_list[i].y - self.pixel_list[i - 1].y
-                segment_length = math.sqrt(delta_x ** 2 + delta_y ** 2)
-                total_length += segment_length
+    @property
+    def coordinate_array(self):
+        """
+        Gets the coordinates and radius of every pixel in this root as one array, joining the segments first if there is
+        more than one.
+        :return: A 2D int64 numpy array with one (y, x, radius) row per pixel, in the same order as pixel_list
+        """
+        if self.coordinate_segment_list is None:
+            self.coordinate_segment_list = [np.array([(pixel.y, pixel.x, pixel.radius) for pixel in self.pixel_list],
+                                                     dtype=np.int64).reshape(-1, 3)]
+        elif len(self.coordinate_segment_list) > 1:
+            self.coordinate_segment_list = [np.concatenate(self.coordinate_segment_list)]
 
-        self.total_length = total_length
-        self.average_radius = total_radius / len(self.pixel_list)
+        return self.coordinate_segment_list[0]
 
     def remove_edge_root(self):
         """
-        Remove a root from its parent's branch list.
-        :return: Returns the parent if it is now an edge root itself, and None otherwise.
+        Remove a root from its parent's branch dict and endpoint branch dict.
+        :return: Returns the parent if it is now an edge root itself, and None otherwise (including when this root has
+        no parent).
         """
 
-        to_remove = None
-
-        # Find this in the parent's branch list
-        if self.parent_root:
-            for branch_tuple in self.parent_root.branch_list:
-                if branch_tuple[1] is self:
-                    to_remove = branch_tuple
-                    break
-
-        if to_remove:
-            self.parent_root.branch_list.remove(to_remove)
-
-        to_remove = None
-
-        # Find this in the parent's endpoint branch list
-        if self.parent_root:
-            for branch in self.parent_root.branches_at_endpoint:
-                if branch is self:
-                    to_remove = branch
-                    break
+        if not self.parent_root:
+            return None
 
-        if to_remove:
-            self.parent_root.branches_at_endpoint.remove(to_remove)
+        self.parent_root.branch_dict.pop(self, None)
+        self.parent_root.branches_at_endpoint.pop(self, None)
 
         if self.parent_root.branches_at_endpoint:
             return None
         else:
             return self.parent_root
 
-
-    def remaining_length_ready(self):
-        """
-
-        :return:
-        """
-
-        ready = True
-
-        for child in self.branches_at_endpoint:
-            if child.remaining_length is None:
-                ready = False
-                break
-
-        return ready
-
     def score_candidate_branch(self, other):
         """
         Calculates the fit between this root and the branch root
@@ -161,7 +158,7 @@ class Root:
         of interest and the first
         """
 
-        total_length = len(self.pixel_list)
+        total_length = self.pixel_count
 
         if total_length < 2:
             return None
@@ -181,7 +178,7 @@ class Root:
         of interest and the first
         """
 
-        total_length = len(self.pixel_list)
+        total_length = self.pixel_count
 
         if total_length < 2:
             return None
@@ -199,7 +196,7 @@ class Root:
         Gets the general radius trend represented by the first few pixels of this root
         :return: a positive float representing the average radius in the area of interest
         """
-        total_length = len(self.pixel_list)
+        total_length = self.pixel_count
 
         if not total_length:
             return 0
@@ -219,7 +216,7 @@ class Root:
         Gets the general radius trend represented by the last few pixels of this root
         :return: a positive float representing the average radius in the area of interest
         """
-        total_length = len(self.pixel_list)
+        total_length = self.pixel_count
 
         if not total_length:
             return 0
@@ -244,47 +241,38 @@ class Root:
         # Remove the first element of other's pixel list [it's the same as self's last element]
         # other.pixel_list = other.pixel_list[1:]
 
+        # Remove other from self's branch dict
+        self.branch_dict.pop(other, None)
+
         # Increase the index of all branches in other by the length of self
-        # Append each member of other's branch list to self's
-        branch_index_change = len(self.pixel_list)
-        for branch in other.branch_list:
-            new_branch = (branch[0]+branch_index_change, branch[1])
-            self.branch_list.append(new_branch)
+        # Add each member of other's branch dict to self's
+        branch_index_change = self.pixel_count
+        for branch_location, branch in other.branch_dict.values():
+            self.branch_dict[branch] = (branch_location + branch_index_change, branch)
 
         self.branches_at_endpoint = other.branches_at_endpoint
 
-        # Append each member of other's pixel list to self's
-        for pixel in other.pixel_list:
-            self.pixel_list.append(pixel)
-
-        to_remove = None
-        # Remove other from self's branch list
-        for branch in self.branches_at_endpoint:
-            if branch is other:
-                to_remove = branch
-                break
-        if to_remove:
-            self.branches_at_endpoint.remove(to_remove)
-
-        to_remove = None
-        # Remove other from self's branch list
-        for branch_tuple in self.branch_list:
-            if branch_tuple[1] is other:
-                to_remove = branch_tuple
-                break
-        if to_remove:
-            self.branch_list.remove(to_remove)
+        # Merge the statistics. other starts on self's last pixel, so the lengths simply add, and that shared pixel
+        # counts once towards each average just as it appears twice in the combined pixel list
+        if self.total_length is not None and other.total_length is not None:
+            self.average_radius = (self.average_radius * self.pixel_count + other.average_radius * other.pixel_count) \
+                / (self.pixel_count + other.pixel_count)
+            self.total_length += other.total_length
+        else:
+            self.average_radius = None
+            self.total_length = None
 
-        # Set each of other's branches' parent to self
-        for branch_tuple in other.branch_list:
-            branch_tuple[1].parent_root = self
+        # Link other's segments onto the end of self's
+        self.segment_list.extend(other.segment_list)
+        if self.coordinate_segment_list is not None and other.coordinate_segment_list is not None:
+            self.coordinate_segment_list.extend(other.coordinate_segment_list)
+        else:
+            self.coordinate_segment_list = None
+        self.pixel_count += other.pixel_count
 
-        for branch in other.branches_at_endpoint:
+        # Set each of other's branches' parent to self
+        for branch in other.branch_dict:
             branch.parent_root = self
 
-        # Invalidate self's statistics
-        self.average_radius = None
-        self.total_length = None
-
         # Return other's key (to be popped from the root_dict)
         return other.key
\ No newline at end of file
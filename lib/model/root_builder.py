@@ -1,18 +1,27 @@
+from collections import deque
+import itertools
+
+import numpy as np
+
 import lib.model.root as rt
+import lib.model.tree_builder as tb
 
 
 class RootBuilder:
 
-    # Contains the tree structures being built in the format {(int y, int x) : Pixel}
-    # WARNING: This is only a shallow copy of TreeBuilder's pixel_dict, and changes to one affect the other.
-    pixel_dict = None
+    # PixelStore holding the tree structures being built, including each pixel's parent
+    # WARNING: This is the same store as TreeBuilder's, and changes to one affect the other.
+    pixel_store = None
 
     # Contains the roots that currently exist in the format {int unique_ID : Root}
     root_dict = None
 
-    # A set of Pixel objects representing the seed points of the trees contained in pixel_dict
+    # A set of Pixel objects representing the seed points of the trees contained in pixel_store
     all_seed_pixels = None
 
+    # Dictionary of form {int parent index: [int child index]} built from the store's parent indices
+    child_lists = None
+
     # A set of Root objects representing the roots from which all other roots can be accessed
     all_seed_roots = None
 
@@ -20,11 +29,12 @@ class RootBuilder:
     total_root_length = None
     average_radius = None
 
-    def __init__(self, pixel_dict, all_seed_pixels):
-        self.pixel_dict = pixel_dict
+    def __init__(self, pixel_store, all_seed_pixels):
+        self.pixel_store = pixel_store
         self.root_dict = dict()
         self.all_seed_pixels = all_seed_pixels
         self.all_seed_roots = set()
+        self.child_lists = tb.TreeBuilder.build_child_lists(pixel_store.parent)
 
     def create_initial_roots(self):
         """
@@ -36,59 +46,69 @@ class RootBuilder:
         # Trace each tree, one at a time
         initial_roots = list()
 
-        for seed in self.all_seed_pixels:
+        # Flat indices of each root's pixels, in the same order as root_dict
+        index_lists = list()
+
+        for seed in sorted(self.all_seed_pixels, key=lambda pixel: (pixel.y, pixel.x)):
 
             initial_root = rt.Root([seed], len(self.root_dict))
             self.root_dict[len(self.root_dict)] = initial_root
+            index_lists.append([seed.y * self.pixel_store.width + seed.x])
 
             self.all_seed_roots.add(initial_root)
             initial_roots.append(initial_root)
 
             # Iteratively create all child roots from the initial point
-        root_queue = initial_roots
+        root_queue = deque(initial_roots)
         while root_queue:
-            for output_root in self.trace_along_children(root_queue.pop(0)):
-                root_queue.append(output_root)
+            root_queue.extend(self.trace_along_children(root_queue.popleft(), index_lists))
+
+        self.set_coordinate_arrays(list(self.root_dict.values()), index_lists)
 
-    def trace_along_children(self, start_root):
+    def trace_along_children(self, start_root, index_lists):
         """
 
         :param start_root: A Root to find children of
+        :param index_lists: A list that the flat indices of each created root's pixels are appended to
         :return: The roots created as offshoots of start_root, as a set. They're passed back into the root_queue in
         create_initial_roots to be used as start_roots in the future.
         """
 
         created_roots = list()
+        width = self.pixel_store.width
+        start_pixel = start_root.pixel_list[-1]
 
         # Not it
-        for current_pixel in start_root.pixel_list[-1].children:
+        for current_index in self.child_lists.get(start_pixel.y * width + start_pixel.x, ()):
 
             # Build a pixel_list to the next branch or endpoint
-            pixel_list = [start_root.pixel_list[-1]]
+            pixel_list = [start_pixel]
+            index_list = [start_pixel.y * width + start_pixel.x]
             not_at_branch = True
             root_not_ended = True
 
             while not_at_branch and root_not_ended:
 
-                pixel_list.append(current_pixel)
+                pixel_list.append(self.pixel_store.get_pixel(current_index))
+                index_list.append(current_index)
+                children = self.child_lists.get(current_index, ())
 
-                if len(current_pixel.children) > 1:
+                if len(children) > 1:
                     not_at_branch = False
 
-                elif not current_pixel.children:
+                elif not children:
                     root_not_ended = False
 
                 else:
-                    # get the single child from the set
-                    for child in current_pixel.children:
-                        current_pixel = child
+                    current_index = children[0]
 
             new_root = rt.Root(pixel_list, len(self.root_dict))
+            index_lists.append(index_list)
 
             # Connect the parent root to the new root
-            branch_location = len(start_root.pixel_list) - 1
-            start_root.branches_at_endpoint.append(new_root)
-            start_root.branch_list.append((branch_location, new_root))
+            branch_location = start_root.pixel_count - 1
+            start_root.branches_at_endpoint[new_root] = new_root
+            start_root.branch_dict[new_root] = (branch_location, new_root)
             new_root.parent_root = start_root
 
             # Add the new root to the dictionary for future use and to the return set
@@ -121,7 +141,7 @@ class RootBuilder:
 
             for root in edge_roots:
 
-                if root and len(root.pixel_list) < radius_multiplier * root.pixel_list[0].radius and root.parent_root:
+                if root and root.pixel_count < radius_multiplier * root.pixel_list[0].radius and root.parent_root:
 
                     self.remove_pixels(root.pixel_list)
 
@@ -135,39 +155,25 @@ class RootBuilder:
 
     def set_remaining_lengths(self):
         """
-
-        :return:
+        Sets the remaining_length of every root: its own total length plus the longest remaining length among the
+        branches at its endpoint. Each root is visited once, after all of its branches.
+        :return: Nothing.
         """
 
-        current_list = list()
+        # List every root breadth-first from the heads of the trees, so each root comes after its parent. The list grows
+        # as it is iterated over
+        root_order = [root for root in self.root_dict.values() if not root.parent_root]
+        for root in root_order:
+            root_order.extend(root.branches_at_endpoint)
 
-        for root in self.root_dict.values():
-            if not root.branches_at_endpoint:
-                current_list.append(root)
+        # Walking the list backwards reaches every branch before the root it grows from
+        for root in reversed(root_order):
+            length_list = [branch.remaining_length for branch in root.branches_at_endpoint]
 
-        while current_list:
-
-            next_list = list()
-
-            for root in current_list:
-
-                if root.remaining_length_ready():
-                    length_list = list()
-                    for branch in root.branches_at_endpoint:
-                        length_list.append(branch.remaining_length)
-
-                    if length_list:
-                        root.remaining_length = max(length_list) + root.total_length
-                    else:
-                        root.remaining_length = root.total_length
-
-                    if root.parent_root:
-                        next_list.append(root.parent_root)
-
-                else:
-                    next_list.append(root)
-
-            current_list = next_list
+            if length_list:
+                root.remaining_length = max(length_list) + root.total_length
+            else:
+                root.remaining_length = root.total_length
 
     def untangle_roots(self):
         """
@@ -177,10 +183,9 @@ class RootBuilder:
         """
 
         for root in self.all_seed_roots:
-            root_queue = [root]
+            root_queue = deque([root])
             while root_queue:
-                for output_root in self.connect_roots(root_queue.pop(0)):
-                    root_queue.append(output_root)
+                root_queue.extend(self.connect_roots(root_queue.popleft()))
 
     def connect_roots(self, start_root):
         """
@@ -195,7 +200,7 @@ class RootBuilder:
             pass
 
         elif len(start_root.branches_at_endpoint) == 1:
-            to_attach = (100, start_root.branches_at_endpoint[0])
+            to_attach = (100, next(iter(start_root.branches_at_endpoint)))
 
         else:
             for root in start_root.branches_at_endpoint:
@@ -220,30 +225,55 @@ class RootBuilder:
 
         return next_roots
 
-    def update_root_statistics_and_totals(self):
+    def set_coordinate_arrays(self, roots, index_lists):
         """
-        Recalculates the statistics for each individual root, then calculates the aggregate statistics.
+        Looks up the coordinates and radius of every pixel of a group of roots in one pass over the store, and gives
+        each root its own slice of the result.
+        :param roots: A list of Root objects
+        :param index_lists: A list holding the flat indices (y * width + x) of each root's pixels, in the same order as
+        roots
         :return: Nothing.
         """
+        pixel_counts = [len(index_list) for index_list in index_lists]
+        indices = np.fromiter(itertools.chain.from_iterable(index_lists), dtype=np.int64, count=sum(pixel_counts))
+        coordinate_array = np.column_stack((indices // self.pixel_store.width, indices % self.pixel_store.width,
+                                            self.pixel_store.radius[indices].astype(np.int64)))
 
-        self.average_radius = 0
-        self.total_root_length = 0
+        end = 0
+        for root, pixel_count in zip(roots, pixel_counts):
+            start, end = end, end + pixel_count
+            root.coordinate_segment_list = [coordinate_array[start:end]]
 
-        total_radius = 0
+    def update_root_statistics_and_totals(self):
+        """
+        Recalculates the statistics for each individual root, then calculates the aggregate statistics. Every root's
+        coordinate array is laid end to end in one array, so all of the roots are measured at once.
+        :return: Nothing.
+        """
+        roots = list(self.root_dict.values())
 
-        for root in self.root_dict.values():
+        if roots:
+            pixel_counts = np.array([root.pixel_count for root in roots], dtype=np.int64)
+            root_starts = np.cumsum(pixel_counts) - pixel_counts
+            coordinate_array = np.concatenate([root.coordinate_array for root in roots])
 
-            root.calculate_root_statistics()
+            # Measure the step into each pixel from the one before it, leaving out the steps between roots
+            step_lengths = np.zeros(len(coordinate_array))
+            step_lengths[1:] = np.hypot(np.diff(coordinate_array[:, 0]), np.diff(coordinate_array[:, 1]))
+            step_lengths[root_starts] = 0
 
-            self.total_root_length += root.total_length
+            total_lengths = np.add.reduceat(step_lengths, root_starts).tolist()
+            average_radii = (np.add.reduceat(coordinate_array[:, 2] + 0.5, root_starts) / pixel_counts).tolist()
 
-            total_radius += root.total_length * root.average_radius
+            for root, total_length, average_radius in zip(roots, total_lengths, average_radii):
+                root.total_length = total_length
+                root.average_radius = average_radius
 
-        self.average_radius = total_radius / self.total_root_length
+        self.update_only_total_statistics()
 
     def update_only_total_statistics(self):
         """
-        Only recalculates the aggregate statistics- use only when roots have been deleted, but not changed.
+        Only recalculates the aggregate statistics- use only when roots have been deleted or combined, but not changed.
         :return: Nothing.
         """
 
@@ -260,6 +290,22 @@ class RootBuilder:
 
         self.average_radius = total_radius / self.total_root_length
 
+    def clear_roots(self):
+        """
+        Breaks the links between roots. Every branch points back at its parent root, so without this the roots form
+        reference cycles that stay in memory until the garbage collector next runs. Call once the roots are no longer
+        needed.
+        :return: Nothing.
+        """
+        for root in self.root_dict.values():
+            root.parent_root = None
+            root.branch_dict.clear()
+            root.branches_at_endpoint.clear()
+
+        self.root_dict.clear()
+        self.all_seed_roots.clear()
+        self.child_lists = None
+
     def remove_pixels(self, pixel_set):
         """
         Iteratively sends pixels from a set to remove_pixel
@@ -271,25 +317,20 @@ class RootBuilder:
 
     def remove_pixel(self, pixel):
         """
-        Cleanly remove all references to a Pixel object, without preserving overall tree structure. This is like
-        deleting the pixel, but without those nasty errors when a former neighbor references it.
+        Cleanly remove a pixel from the store, without preserving overall tree structure. Its children are left without
+        a parent.
         :param pixel: The pixel to be removed.
         :return: Nothing.
         """
-        key = (pixel.y, pixel.x)
-
-        if pixel.children:
-            for child in pixel.children:
-                child.parents.discard(pixel)
+        index = pixel.y * self.pixel_store.width + pixel.x
+        parents = self.pixel_store.parent
 
-        if pixel.parents:
-            for parent in pixel.parents:
-                parent.children.discard(pixel)
+        for child in self.child_lists.pop(index, ()):
+            parents[child] = -1
 
-        for i in range(8):
-            if pixel.neighbors[i]:
-                neighbor = pixel.neighbors[i]
-                this_pixel_loc = (i+4) % 8
-                neighbor.neighbors[this_pixel_loc] = None
+        parent = parents[index]
+        if parent >= 0:
+            self.child_lists[parent].remove(index)
+            parents[index] = -1
 
-        self.pixel_dict.pop(key, None)
+        self.pixel_store.alive[index] = False
@@ -1,8 +1,17 @@
+import heapq
+
+from scipy import ndimage, spatial
+from scipy.sparse import csgraph, csr_matrix
+import numpy as np
+
+import lib.model.pixel as px
+
+
 class TreeBuilder:
-    # Contains the tree structures being built in the format {(int y, int x) : Pixel}
-    # WARNING: This is only a shallow copy of AreaBuilder's pixel_dict, and changes to one affect the other.
-    # This is also copied by RootBuilder, and is likely to be unreliable after RootBuilder is initialized.
-    pixel_dict = None
+    # PixelStore holding the tree structures being built. Pruning a pixel clears its alive flag
+    # WARNING: This is the same store as AreaBuilder's, and changes to one affect the other.
+    # It is also used by RootBuilder, and is likely to be unreliable after RootBuilder is initialized.
+    pixel_store = None
 
     # A Pixel object that best approximates a user's click location. Is the most reliable starting point for tree
     # building and root tracing
@@ -11,175 +20,206 @@ class TreeBuilder:
     # A set consisting of best_pixel and the automatically generated seed points for any auxiliary trees
     all_seed_pixels = None
 
+    # 256-entry boolean table of check_sequences results, indexed by 8-bit neighbor code (see PixelStore)
+    skeleton_table = None
+
+    # 256-entry boolean table of the neighbor codes that remove_right_angles removes
+    right_angle_table = None
+
     # Pixel counts, for statistical output purposes
     initial_pixel_count = None
     previous_pixel_count = None
 
-    def __init__(self, pixel_dict):
-        self.pixel_dict = pixel_dict
+    def __init__(self, pixel_store):
+        self.pixel_store = pixel_store
+        self.skeleton_table = self.build_skeleton_table()
+        self.right_angle_table = self.build_right_angle_table()
         self.all_seed_pixels = set()
-        self.trash = set()
-        self.initial_pixel_count = len(pixel_dict)
-        self.previous_pixel_count = len(pixel_dict)
+        self.initial_pixel_count = pixel_store.count()
+        self.previous_pixel_count = self.initial_pixel_count
 
-    def find_best_pixel(self, click_location):
+    def find_best_pixel(self, click_location, pixel_tree=None):
         """
         Finds the ideal seed point location near the user's click location
         :param click_location: Tuple of form (int y, int x) with both values positive. Represents the location on the
         image that was clicked.
-        :return: Nothing.
+        :param pixel_tree: Optional cKDTree over the remaining pixels' (y, x) locations, as returned by
+        build_pixel_tree. Pass one in when snapping several points against the same mask.
+        :return: The Pixel found, or None if there are no pixels left.
         """
-        key_range = 0
-        looking_for_seed_pixel = True
+        if pixel_tree is None:
+            pixel_tree = self.build_pixel_tree()
+        if pixel_tree.n == 0:
+            return None
 
-        while looking_for_seed_pixel:
-            for x in range(click_location[1] - key_range, click_location[1] + key_range + 1):
-                for y in range(click_location[0] - key_range, click_location[0] + key_range + 1):
-                    key = (y, x)
-                    if key in self.pixel_dict:
-                        largest_local = self.find_local_max_radius(self.pixel_dict[key])
-                        return largest_local
-            key_range += 1
+        # Take the nearest pixel by chessboard distance, which is the square ring the click would be grown to before
+        # a pixel was found. Ties go to the lowest x, then the lowest y
+        distance = pixel_tree.query(click_location, p=np.inf)[0]
+        nearby_indices = pixel_tree.query_ball_point(click_location, distance, p=np.inf)
+        y, x = min((tuple(pixel_tree.data[index].astype(int).tolist()) for index in nearby_indices),
+                   key=lambda location: (location[1], location[0]))
 
-    @staticmethod
-    def find_local_max_radius(start_pixel):
+        return self.pixel_store.get_pixel(self.find_local_max_radius(y, x))
+
+    def build_pixel_tree(self):
+        """
+        Builds a spatial index over the pixels currently in the mask, for nearest-pixel lookups.
+        :return: A cKDTree over the (y, x) locations of the remaining pixels.
+        """
+        return spatial.cKDTree(np.argwhere(self.pixel_store.get_mask()))
+
+    def find_local_max_radius(self, start_y, start_x):
         """
         Finds the local maximum of radius, to find the center-most point of the local root. This function will not
         traverse neighbors of equal or lesser radius. This keeps the output point near the click point and keeps the
         code simple.
-        :param start_pixel: The Pixel object to start the search from
-        :return: The largest Pixel encountered by the function
+        :param start_y: The y-location of the pixel to start the search from
+        :param start_x: The x-location of the pixel to start the search from
+        :return: The flat index (y * width + x) of the largest pixel encountered by the function
         """
+        mask = self.pixel_store.get_mask()
+        radius_array = self.pixel_store.get_radius_array()
+        height, width = mask.shape
+
         larger_neighbor_exists = True
-        largest_local = start_pixel
+        largest_y, largest_x = start_y, start_x
 
         while larger_neighbor_exists:
             larger_neighbor_exists = False
 
-            for neighbor in largest_local.neighbors:
-                if neighbor and neighbor.radius > largest_local.radius:
-                    largest_local = neighbor
+            # Every neighbor of the pixel the pass started from is checked against the largest pixel found so far
+            center_y, center_x = largest_y, largest_x
+            for delta_y, delta_x in px.Pixel.neighbor_offsets:
+                y, x = center_y + delta_y, center_x + delta_x
+                if 0 <= y < height and 0 <= x < width and mask[y, x] and \
+                        radius_array[y, x] > radius_array[largest_y, largest_x]:
+                    largest_y, largest_x = y, x
                     larger_neighbor_exists = True
 
-        return largest_local
+        return largest_y * width + largest_x
 
     def find_small_areas(self, min_tree_size):
-        all_pixels = list()
-
-        for pixel in sorted(self.pixel_dict.values(), key=self.getkey):
-            all_pixels.append(pixel)
-
-        for pixel in all_pixels:
-
-            if None not in pixel.neighbors:
-
-                if not pixel.is_visited:
-
-                    if self.check_area_for_size(pixel, min_tree_size):
-                        self.all_seed_pixels.add(pixel)
-
-    def check_area_for_size(self, start_pixel, min_tree_size):
-        pixel_set = {start_pixel}
-
-        previous_set = {start_pixel}
-
-        current_set = set()
-        for neighbor in start_pixel.neighbors:
-            if neighbor:
-                current_set.add(neighbor)
-
-        next_set_exists = False
-
-        if current_set:
-            next_set_exists = True
-
-        while next_set_exists:
+        """
+        Labels every connected area of the mask at once, removes the areas that are too small to be part of a root
+        system, and picks a seed pixel for each area that survives. Only areas with at least one interior pixel (one
+        with all 8 neighbors) are considered, and the seed is the interior pixel with the lowest radius and intensity.
+        :param min_tree_size: The minimum number of pixels an area must have to be kept.
+        :return: Nothing.
+        """
+        mask = self.pixel_store.get_mask()
+        labels, label_count = ndimage.label(mask, structure=np.ones((3, 3), dtype=bool))
+        area_sizes = np.bincount(labels.ravel(), minlength=label_count + 1)
 
-            next_set = set()
+        # Interior pixels all have a radius of at least 1, and any area with an interior pixel has a radius 1 pixel.
+        # Sort those by (label, intensity, row-major position) and take the first of each label as that area's seed
+        candidate_y, candidate_x = np.nonzero(mask & (self.pixel_store.get_radius_array() == 1))
+        candidate_labels = labels[candidate_y, candidate_x]
+        order = np.lexsort((self.pixel_store.get_intensity_array()[candidate_y, candidate_x], candidate_labels))
+        seed_labels, first_indices = np.unique(candidate_labels[order], return_index=True)
+        seed_y = candidate_y[order][first_indices]
+        seed_x = candidate_x[order][first_indices]
 
-            for pixel in current_set:
-                pixel.is_visited = True
-                for neighbor in pixel.neighbors:
-                    if neighbor and (neighbor not in previous_set) and (neighbor not in current_set):
-                        if not neighbor.is_visited:
-                            next_set.add(neighbor)
-                            pixel_set.add(neighbor)
+        is_small = area_sizes[seed_labels] < min_tree_size
 
-            if not next_set:
-                next_set_exists = False
-            else:
-                previous_set = current_set
-                current_set = next_set
+        for y, x in zip(seed_y[~is_small].tolist(), seed_x[~is_small].tolist()):
+            self.all_seed_pixels.add(self.pixel_store.get_pixel(y * self.pixel_store.width + x))
 
-        if len(pixel_set) < min_tree_size:
-            self.remove_pixels(pixel_set)
-            return False
-        else:
-            return True
+        mask &= ~np.isin(labels, seed_labels[is_small])
 
     def prune_redundant_pixels(self):
         """
-        Iteratively strips the outermost set of pixels from the dictionary, leaving only those touching black space on
+        Iteratively strips the outermost set of pixels from the store, leaving only those touching black space on
         at least two sides. This necessarily leaves a line of width 1 px at the midpoint of the root (and a lot of other
         intricate-garbage offshoots we'll deal with in the next several steps)
+        Pixels are visited one radius layer at a time, in the same order as a sequential walk that starts from the
+        radius 0 pixels sorted by intensity and discovers each next layer through the neighbors of the current one.
         :return: Nothing.
         """
-        current_list = list()
-        current_set = set()
+        # Work on flat copies of the arrays padded with a background border, so every neighbor index is in bounds. The
+        # alive flags live in a byte array, which is cheap to check one pixel at a time, and are also viewed as a numpy
+        # array for finding each next layer
+        mask = self.pixel_store.get_mask()
+        padded_width = self.pixel_store.width + 2
+        alive_bytes = bytearray(np.pad(mask, 1).tobytes())
+        alive = np.frombuffer(alive_bytes, dtype=bool)
+        radii = np.pad(self.pixel_store.get_radius_array(), 1, constant_values=-1).ravel()
+        intensities = np.pad(self.pixel_store.get_intensity_array(), 1).ravel()
+        offsets = np.array([delta_y * padded_width + delta_x for delta_y, delta_x in px.Pixel.neighbor_offsets])
+
+        # Build the initial edge layer, ordered by intensity with ties broken by row-major position
+        current_layer = np.flatnonzero(alive & (radii == 0))
+        current_layer = current_layer[np.argsort(intensities[current_layer], kind='stable')]
         current_radius_value = 0
+        offset_list = offsets.tolist()
 
-        # Build initial edge set
-        for pixel in sorted(self.pixel_dict.values(), key=self.getkey):
-            if pixel.radius == current_radius_value:
-                current_list.append(pixel)
-                current_set.add(pixel)
-
-        # Iteratively build the next set and call check_if_skeleton on the current set, removing pixels that aren't part
-        # of the skeleton
-        while current_set:
+        while current_layer.size:
             current_radius_value += 1
 
-            next_list = []
-            next_set = set()
-
-            for pixel in current_list:
+            # The next layer is discovered before any of this layer is removed, since removals never break a link
+            # between this layer and the next
+            next_layer = self.order_next_layer(current_layer, alive, radii, offsets, current_radius_value)
 
-                for neighbor in pixel.neighbors:
-                    if neighbor and neighbor.radius == current_radius_value:
-                        if neighbor not in current_set and neighbor not in next_set:
-                            next_list.append(neighbor)
-                            next_set.add(neighbor)
+            self.thin_layer(current_layer.tolist(), alive_bytes, offset_list)
 
-                if not self.check_if_skeleton(pixel):
-                    self.remove_pixel(pixel)
+            current_layer = next_layer
 
-            current_list = next_list
-            current_set = next_set
+        mask[:] = alive.reshape(mask.shape[0] + 2, padded_width)[1:-1, 1:-1]
 
     @staticmethod
-    def getkey(pixel):
-        return pixel.radius, pixel.intensity
+    def order_next_layer(current_layer, alive, radii, offsets, radius_value):
+        """
+        Finds the pixels of the next radius layer in the order they would be discovered by walking current_layer in
+        order and checking each pixel's neighbors clockwise from northwest.
+        :param current_layer: Flat (padded) indices of the current layer, in processing order.
+        :param alive: Flat (padded) boolean array of the pixels still present.
+        :param radii: Flat (padded) radius array.
+        :param offsets: Flat index offset to each of the 8 neighbor locations.
+        :param radius_value: The radius of the layer being discovered.
+        :return: Flat (padded) indices of the next layer, in processing order.
+        """
+        candidates = current_layer[:, np.newaxis] + offsets[np.newaxis, :]
+        is_next = alive[candidates] & (radii[candidates] == radius_value)
 
-    def check_if_skeleton(self, pixel):
+        # Boolean indexing reads the candidates in discovery order, so each pixel's first occurrence is its position
+        discovered = candidates[is_next]
+        first_seen = np.unique(discovered, return_index=True)[1]
+
+        return discovered[np.sort(first_seen)]
+
+    def thin_layer(self, layer, alive, offsets):
         """
-        Breaks a pixel's neighbors into lists of the location of neighbors and black space, and calls check_sequences to
-        analyze if the pixel is a skeleton pixel or not.
-        :param pixel: The Pixel up for analysis.
-        :return: The result of check_sequences(pixel's neighbor's locations), unless the node is completely surrounded
-        by black space, which yields False.
+        Removes the non-skeletal pixels of a single radius layer, checking them one at a time in order. Removing a pixel
+        changes the neighbor codes of the pixels after it, so each code is read just before its pixel is checked.
+        :param layer: List of the flat (padded) indices of the layer, in processing order.
+        :param alive: Flat (padded) bytearray of the pixels still present. Updated in place.
+        :param offsets: List of the flat index offset to each of the 8 neighbor locations.
+        :return: Nothing.
         """
-        pixel_loc_list = []
+        skeleton_table = self.skeleton_table.tolist()
 
-        # Create a list of the locations pixel has neighbors. Locations are identified by the numbers assigned to them
-        # in the pixel.py file the class was defined in (clockwise from northwest, starting at 0)
-        for i in range(8):
-            if pixel.neighbors[i]:
-                pixel_loc_list.append(i)
+        for index in layer:
+            code = 0
+            for i in range(8):
+                if alive[index + offsets[i]]:
+                    code |= 1 << i
 
-        if not pixel_loc_list:
-            return False
-        else:
-            return self.check_sequences(pixel_loc_list)
+            if not skeleton_table[code]:
+                alive[index] = 0
+
+    @staticmethod
+    def build_skeleton_table():
+        """
+        Evaluates check_sequences for every possible 8-bit neighbor code.
+        :return: A boolean numpy array of length 256 that is True for the codes of skeletal pixels. A code with no
+        neighbors at all is not skeletal.
+        """
+        table = np.zeros(256, dtype=bool)
+
+        for code in range(1, 256):
+            loc_list = [i for i in range(8) if code & (1 << i)]
+            table[code] = TreeBuilder.check_sequences(loc_list)
+
+        return table
 
     @staticmethod
     def check_sequences(loc_list):
@@ -196,47 +236,17 @@ class TreeBuilder:
 
         sequence_count = 0
         # Account for the possibility of a sequence breaking between 7 and 0
-        if loc_list[0] is not 0 or loc_list[-1] is not 7:
+        if loc_list[0] != 0 or loc_list[-1] != 7:
             sequence_count += 1
 
         # Find every interruption in a linear progression of locations, recording each as a broken sequence
         for i in range(len(loc_list) - 1):
-            if loc_list[i + 1] - loc_list[i] is not 1:
+            if loc_list[i + 1] - loc_list[i] != 1:
                 sequence_count += 1
 
         # Return True for lists representing multiple sequences
         return sequence_count > 1
 
-    def prune_internal_pixels(self):
-        """
-        Removes any pixels that are completely covered by a neighboring pixel.
-        :return: Nothing.
-        """
-        current_list = []
-        current_radius = 0
-        for pixel in sorted(self.pixel_dict.values(), key=self.getkey):
-            if pixel.radius == current_radius:
-                current_list.append(pixel)
-
-        while current_list:
-            next_list = []
-            for pixel in current_list:
-
-                pixel_is_covered = False
-
-                # Check if any of this pixel's neighbors have a larger radius than this
-                # Because of the method used to assign radii, a neighbor with a radius one larger than the current
-                # pixel's is guaranteed to cover all the area that the original pixel does
-                for neighbor in pixel.neighbors:
-                    if neighbor and neighbor.radius > pixel.radius:
-                        next_list.append(neighbor)
-                        pixel_is_covered = True
-
-                if pixel_is_covered:
-                    self.remove_pixel(pixel)
-
-            current_list = next_list
-
     def set_tree_relationships(self):
         """
         Sets parent-child relationships through all remaining areas of the dictionary. It's assumed that the head of the
@@ -245,101 +255,203 @@ class TreeBuilder:
         """
         # Ensure that the seed pixels haven't been removed and update them if they have
         new_seed_pixels = set()
+        pixel_tree = self.build_pixel_tree()
         for pixel in self.all_seed_pixels:
             key = (pixel.y, pixel.x)
-            new_seed = self.find_best_pixel(key)
+            new_seed = self.find_best_pixel(key, pixel_tree)
             if new_seed:
                 new_seed_pixels.add(new_seed)
         self.all_seed_pixels = new_seed_pixels
 
-        previous_set = set()
-        current_set = self.all_seed_pixels
-        while current_set:
-            next_set = set()
-            for pixel in current_set:
-                for neighbor in pixel.neighbors:
-                    if neighbor and neighbor not in current_set and neighbor not in previous_set:
-                        if not neighbor.parents:
-                            pixel.set_child(neighbor)
-                            next_set.add(neighbor)
-            previous_set = current_set
-            current_set = next_set
+        # Export the skeleton as a sparse adjacency matrix over the remaining pixels, plus one extra node joined to
+        # every seed so a single breadth-first search covers all of the trees at once
+        width = self.pixel_store.width
+        pixel_indices = np.flatnonzero(self.pixel_store.alive)
+        node_count = pixel_indices.size
+        node_lookup = np.full(self.pixel_store.alive.size, -1, dtype=np.int64)
+        node_lookup[pixel_indices] = np.arange(node_count)
+
+        self.pixel_store.update_neighbor_codes()
+        neighbor_codes = self.pixel_store.neighbor_codes[pixel_indices]
+
+        # Node of the neighbor in each of the 8 locations around every pixel, or -1 where there is none
+        neighbor_nodes = np.full((node_count, 8), -1, dtype=np.int64)
+        for location, (delta_y, delta_x) in enumerate(px.Pixel.neighbor_offsets):
+            has_neighbor = (neighbor_codes & (1 << location)) != 0
+            neighbor_nodes[has_neighbor, location] = \
+                node_lookup[pixel_indices[has_neighbor] + delta_y * width + delta_x]
+
+        start_nodes, locations = np.nonzero(neighbor_nodes >= 0)
+        end_nodes = neighbor_nodes[start_nodes, locations]
+
+        seed_nodes = np.unique(node_lookup[[pixel.y * width + pixel.x for pixel in self.all_seed_pixels]])
+        start_nodes = np.concatenate((start_nodes, np.full(seed_nodes.size, node_count)))
+        end_nodes = np.concatenate((end_nodes, seed_nodes))
+        adjacency = csr_matrix((np.ones(start_nodes.size, dtype=np.int8), (start_nodes, end_nodes)),
+                               shape=(node_count + 1, node_count + 1))
+
+        # One search from the extra node gives every pixel's level, counted from 1 at the seeds
+        levels = csgraph.shortest_path(adjacency, directed=True, unweighted=True, indices=node_count)[:node_count]
+        levels = np.where(np.isfinite(levels), levels, -1).astype(np.int64)
+
+        # A pixel's parent is one of its neighbors on the previous level. Most pixels have just one such neighbor, but
+        # the pruned skeleton is often two pixels wide, so many have two. The old set-based search settled those by the
+        # order its sets happened to iterate in, which was effectively random. Each candidate instead gets a scrambled
+        # key from its location and the lowest key wins, which is close to that behavior but the same on every run.
+        # The predecessors from csgraph.breadth_first_order aren't used: they always pick the candidate discovered
+        # first, which follows the row-major node numbering. On generated root images that measured 10-14% more root
+        # length than the old search, with nearly twice as many initial roots
+        is_candidate = (neighbor_nodes >= 0) & (levels[:, np.newaxis] > 1) & \
+            (levels[neighbor_nodes] == levels[:, np.newaxis] - 1)
+        tie_keys = self.scramble_locations(pixel_indices)
+        candidate_keys = np.where(is_candidate, tie_keys[neighbor_nodes], np.iinfo(np.uint64).max)
+
+        # Seeds and pixels no seed can reach have no parent
+        child_nodes = np.flatnonzero(is_candidate.any(axis=1))
+        parent_locations = candidate_keys[child_nodes].argmin(axis=1)
+        self.pixel_store.parent[:] = -1
+        self.pixel_store.parent[pixel_indices[child_nodes]] = \
+            pixel_indices[neighbor_nodes[child_nodes, parent_locations]]
+
+    @staticmethod
+    def scramble_locations(indices):
+        """
+        Maps flat pixel locations to keys that are arbitrary but fixed, so that ordering pixels by key gives no
+        preference to any direction. Uses the splitmix64 finalizer.
+        :param indices: Array of non-negative flat pixel locations.
+        :return: Array of uint64 keys, one per location.
+        """
+        keys = indices.astype(np.uint64)
+        with np.errstate(over='ignore'):
+            keys = (keys ^ (keys >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            keys = (keys ^ (keys >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return keys ^ (keys >> np.uint64(31))
 
     def remove_right_angles(self):
         """
-        Removes certain inefficient connection patterns that make some roots appear to have 2-pixel wide skeletons
+        Removes certain inefficient connection patterns that make some roots appear to have 2-pixel wide skeletons.
+        Pixels are checked one at a time in row-major order, and removing a pixel changes the neighbor codes of the
+        pixels around it, so only the pixels that match a pattern up front and the later neighbors of removed pixels
+        ever need to be checked.
         :return: Nothing.
         """
-        all_pixels = list()
-
-        for pixel in self.pixel_dict.values():
-            all_pixels.append(pixel)
+        # Track the mask as a flat byte array padded with a background border, so lookups are cheap and in bounds
+        width = self.pixel_store.width
+        padded_width = width + 2
+        padded_mask = np.pad(self.pixel_store.get_mask(), 1)
+        alive = bytearray(padded_mask.tobytes())
+        offsets = [delta_y * padded_width + delta_x for delta_y, delta_x in px.Pixel.neighbor_offsets]
+
+        # Flat indices of the pixels that currently match a pattern, which are already in row-major order
+        self.pixel_store.update_neighbor_codes()
+        neighbor_codes = np.pad(self.pixel_store.neighbor_codes.reshape(padded_mask.shape[0] - 2, width), 1)
+        pending = np.flatnonzero(padded_mask & self.right_angle_table[neighbor_codes]).tolist()
+        last_checked = -1
+
+        # Seeds are the only way into their trees, so they are never removed
+        seed_indices = {(pixel.y + 1) * padded_width + pixel.x + 1 for pixel in self.all_seed_pixels}
+
+        while pending:
+            index = heapq.heappop(pending)
+
+            # A pixel can be queued more than once, but only needs checking the first time it comes up
+            if index == last_checked:
+                continue
+            last_checked = index
+
+            code = 0
+            for i in range(8):
+                if alive[index + offsets[i]]:
+                    code |= 1 << i
 
-        for pixel in all_pixels:
+            if not self.right_angle_table[code] or index in seed_indices:
+                continue
 
-            loc_list = []
+            alive[index] = 0
+            y, x = divmod(index, padded_width)
+            self.pixel_store.alive[(y - 1) * width + x - 1] = False
 
-            for i in range(8):
-                if pixel.neighbors[i]:
-                    loc_list.append(i)
+            # Removing this pixel changes its neighbors' codes, so any neighbor that hasn't been checked yet could now
+            # match a pattern
+            for offset in offsets:
+                if offset > 0 and alive[index + offset]:
+                    heapq.heappush(pending, index + offset)
 
-            invalid_l_trees = [[1, 3], [3, 5], [5, 7], [1, 7]]
+        self.reattach_orphans()
 
-            if len(loc_list) == 2:
-                if loc_list in invalid_l_trees:
-                    self.remove_pixel(pixel)
+    def reattach_orphans(self):
+        """
+        Hands the children of removed pixels to their nearest remaining ancestor, which preserves the overall tree
+        structure. Removing pixels one at a time and passing their children up to their parent gives the same result.
+        Children whose ancestors were all removed are left without a parent.
+        :return: Nothing.
+        """
+        parents = self.pixel_store.parent
+        is_removed = ~self.pixel_store.alive
 
-            invalid_t_trees = [[1, 3, 5], [3, 5, 7], [1, 5, 7], [1, 3, 7]]
+        has_removed_parent = (parents >= 0) & is_removed[np.maximum(parents, 0)]
+        while has_removed_parent.any():
+            parents[has_removed_parent] = parents[parents[has_removed_parent]]
+            has_removed_parent = (parents >= 0) & is_removed[np.maximum(parents, 0)]
 
-            invalid_z_trees = [[0, 1, 3], [0, 5, 7], [1, 2, 7], [1, 3, 4], [1, 6, 7], [2, 3, 5], [3, 5, 6], [4, 5, 7]]
+        parents[is_removed] = -1
 
-            if len(loc_list) == 3:
-                if loc_list in invalid_t_trees:
-                    self.remove_pixel(pixel)
-                elif loc_list in invalid_z_trees:
-                    self.remove_pixel(pixel)
+    def get_tree_levels(self):
+        """
+        Walks the trees outward from their seeds, one generation at a time.
+        :return: A list of int arrays, where the nth array holds the row-major flat indices of the pixels n steps away
+        from a seed.
+        """
+        width = self.pixel_store.width
+        child_lists = self.build_child_lists(self.pixel_store.parent)
 
-            invalid_w_trees = [[0, 1, 3, 4], [0, 4, 5, 7], [1, 2, 6, 7], [2, 3, 5, 6]]
+        levels = list()
+        current_level = sorted({pixel.y * width + pixel.x for pixel in self.all_seed_pixels})
+        while current_level:
+            levels.append(np.array(current_level, dtype=np.int64))
+            current_level = [child for index in current_level for child in child_lists.get(index, ())]
 
-            if len(loc_list) == 4:
-                if loc_list in invalid_w_trees:
-                    self.remove_pixel(pixel)
+        return levels
 
-    def remove_pixels(self, pixel_set):
+    @staticmethod
+    def build_child_lists(parent_array):
         """
-        Iteratively sends pixels from a set to remove_pixel
-        :param pixel_set: A set of pixel objects slated for removal
-        :return: Nothing.
+        Inverts a parent array into lists of children.
+        :param parent_array: An int array of parent flat indices, with -1 for pixels without a parent.
+        :return: A dictionary of form {int parent index: [int child index]}, with each list in ascending order.
         """
-        for pixel in pixel_set:
-            self.remove_pixel(pixel)
+        parents = parent_array.ravel()
+        child_indices = np.flatnonzero(parents >= 0)
+        child_indices = child_indices[np.argsort(parents[child_indices], kind='stable')]
+        sorted_parents = parents[child_indices]
+        unique_parents, starts = np.unique(sorted_parents, return_index=True)
+
+        child_lists = dict()
+        for parent, children in zip(unique_parents.tolist(), np.split(child_indices, starts[1:])):
+            child_lists[parent] = children.tolist()
 
-    def remove_pixel(self, pixel):
+        return child_lists
+
+    @staticmethod
+    def build_right_angle_table():
         """
-        Cleanly remove all references to a Pixel object, while preserving overall tree structure. This is like deleting
-        the pixel, but without those nasty errors when a former neighbor references it.
-        :param pixel: The pixel to be removed.
-        :return: Nothing.
+        Compiles the inefficient L, T, Z and W connection patterns into a table over every possible neighbor code.
+        :return: A boolean numpy array of length 256 that is True for the codes of pixels remove_right_angles removes.
         """
-        key = (pixel.y, pixel.x)
+        invalid_l_trees = [[1, 3], [3, 5], [5, 7], [1, 7]]
+
+        invalid_t_trees = [[1, 3, 5], [3, 5, 7], [1, 5, 7], [1, 3, 7]]
 
-        if pixel.children:
-            for child in pixel.children:
-                child.parents.discard(pixel)
+        invalid_z_trees = [[0, 1, 3], [0, 5, 7], [1, 2, 7], [1, 3, 4], [1, 6, 7], [2, 3, 5], [3, 5, 6], [4, 5, 7]]
 
-        if pixel.parents:
-            for parent in pixel.parents:
-                parent.children.discard(pixel)
+        invalid_w_trees = [[0, 1, 3, 4], [0, 4, 5, 7], [1, 2, 6, 7], [2, 3, 5, 6]]
 
-        if pixel.children and pixel.parents:
-            for child in pixel.children:
-                for parent in pixel.parents:
-                    parent.set_child(child)
+        table = np.zeros(256, dtype=bool)
 
-        for i in range(8):
-            if pixel.neighbors[i]:
-                neighbor = pixel.neighbors[i]
-                this_pixel_loc = (i + 4) % 8
-                neighbor.neighbors[this_pixel_loc] = None
+        for loc_list in invalid_l_trees + invalid_t_trees + invalid_z_trees + invalid_w_trees:
+            code = 0
+            for i in loc_list:
+                code |= 1 << i
+            table[code] = True
 
-        self.pixel_dict.pop(key, None)
+        return table
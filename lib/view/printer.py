@@ -1,63 +1,74 @@
 from PIL import Image, ImageDraw
+from scipy import ndimage
 import numpy as np
 import random
 import os
 
 
 class Printer:
-    array = None
+    # RGB PIL Image that every stage draws onto. It stays in memory for the whole run and is only written to
+    # updated_image_path by save_image
+    image = None
 
     updated_image_path = None
     image_height = None
     image_width = None
 
-    current_color = [255, 255, 255]
-    current_ascending = [False, False, False]
+    # RGB color for the next thing drawn, and whether each channel is currently counting up. These belong to each
+    # Printer, so one image's drawing never changes the colors of the next
+    current_color = None
+    current_ascending = None
 
     def __init__(self, path, shape):
         self.updated_image_path = path
         self.image_height = shape[0]
         self.image_width = shape[1]
+        self.current_color = [255, 255, 255]
+        self.current_ascending = [False, False, False]
 
-    def print_original_image(self, pixel_dict):
+    def print_original_image(self, mask):
         """
-        Creates a representation of the Pixel objects contained in pixel_dict
-        :param pixel_dict: A dictionary of form {(y, x): Pixel} to be printed
-        :return: Nothing. Upon successful run, self.array contains a dark outline for error checking purposes and the
-        same array will be printed to the Output folder with -analysis appended to the filename
+        Creates a representation of the pixel locations marked in mask
+        :param mask: A 2D boolean array of the pixel locations to be printed
+        :return: Nothing. Upon successful run, self.image contains a dark outline for error checking purposes
         """
 
-        self.array = np.zeros((self.image_height, self.image_width, 3), dtype=np.uint8)
-        for (y, x) in pixel_dict:
-            self.array[y][x] = [20, 20, 20]
+        array = np.zeros((self.image_height, self.image_width, 3), dtype=np.uint8)
+        array[mask] = 20
 
-        output_image = Image.fromarray(self.array, 'RGB')
-        output_image.save(self.updated_image_path)
+        self.image = Image.fromarray(array, 'RGB')
 
-    def print_skeletal_outline(self, seed_pixel_set):
+    def print_skeletal_outline(self, tree_levels):
         """
         Prints a representation of the parent-child connections in a set of trees, colorized with a gradient for easy
         visual tracing and error checking.
-        :param seed_pixel_set: The set of seed pixels to start drawing from.
-        :return: Nothing. Upon successful completion, the image can be found in the output folder, with "-analysis"
-        appended to the original filename.
+        :param tree_levels: A list of int arrays holding the row-major flat indices of the pixels at each generation of
+        the trees, starting from the seed pixels.
+        :return: Nothing. Upon successful completion, the skeleton has been drawn onto self.image.
         """
-        current_set = seed_pixel_set
+        palette = self.build_palette(len(tree_levels), 1)
+        level_numbers = np.repeat(np.arange(len(tree_levels)), [len(level) for level in tree_levels])
 
-        while current_set:
-            next_set = set()
+        array = np.array(self.image)
+        if tree_levels:
+            array.reshape(-1, 3)[np.concatenate(tree_levels)] = palette[level_numbers]
 
-            for pixel in current_set:
-                self.array[pixel.y, pixel.x] = self.current_color
-                for child in pixel.children:
-                    next_set.add(child)
+        self.image = Image.fromarray(array, 'RGB')
 
-            self.increment_current_color(1)
-
-            current_set = next_set
+    def build_palette(self, color_count, multiplier):
+        """
+        Lists the colors that would be used by drawing color_count things in a row, calling increment_current_color
+        after each one. The current color is advanced past them, just as if they had been drawn one by one.
+        :param color_count: The number of colors to list
+        :param multiplier: A positive integer representing the rate at which colors should change
+        :return: A (color_count, 3) uint8 array of RGB colors, clipped to the range the image can hold
+        """
+        palette = np.zeros((color_count, 3), dtype=np.uint8)
+        for i in range(color_count):
+            palette[i] = np.clip(self.current_color, 0, 255)
+            self.increment_current_color(multiplier)
 
-        output_image = Image.fromarray(self.array, 'RGB')
-        output_image.save(self.updated_image_path)
+        return palette
 
     def increment_current_color(self, multiplier):
         """
@@ -99,45 +110,47 @@ class Printer:
         """
         Prints a representation of the root connections flowing from the roots in all_seed_roots
         :param all_seed_roots: An iterable containing Root objects to print from
-        :return: Nothing. Upon successful completion, the image can be found in the Output folder with -roots appended
-        to the filename
+        :return: Nothing. Upon successful completion, the roots have been drawn onto self.image.
         """
 
         self.current_color = [255, 255, 255]
         self.current_ascending = [False, False, False]
 
-        image = Image.open(self.updated_image_path)
-        drawer = ImageDraw.Draw(image)
-
-        current_roots = all_seed_roots
-
+        # Put the roots in drawing order, one generation at a time and by key within each generation
+        root_order = list()
+        current_roots = sorted(all_seed_roots, key=lambda root: root.key)
         while current_roots:
-
-            next_roots = set()
-
-            for root in current_roots:
-
-                for i in range(len(root.pixel_list)):
-
-                    if i > 0:
-
-                        current_xy = (root.pixel_list[i].x, root.pixel_list[i].y)
-                        previous_xy = (root.pixel_list[i - 1].x, root.pixel_list[i - 1].y)
-                        drawer.line([previous_xy, current_xy], tuple(self.current_color))
-
-                    else:
-
-                        current_xy = (root.pixel_list[i].x, root.pixel_list[i].y)
-                        drawer.point(current_xy, tuple(self.current_color))
-
-                for branch_tuple in root.branch_list:
-                    next_roots.add(branch_tuple[1])
-
-                self.increment_current_color(20)
-
-            current_roots = next_roots
-
-        image.save(self.updated_image_path)
+            root_order.extend(current_roots)
+            current_roots = sorted({branch for root in current_roots for branch in root.branch_dict},
+                                   key=lambda root: root.key)
+
+        palette = self.build_palette(len(root_order), 20)
+        root_numbers = np.repeat(np.arange(len(root_order)), [root.pixel_count for root in root_order])
+
+        # Drawing a root means drawing a line from each of its pixels to the next, and roots drawn later cover earlier
+        # ones. Number every pixel in drawing order, and find the last number to reach each location
+        locations = np.array([(pixel.y, pixel.x) for root in root_order for pixel in root.pixel_list],
+                             dtype=np.int64).reshape(-1, 2)
+        flat_locations = locations[:, 0] * self.image_width + locations[:, 1]
+        last_drawn = np.full(self.image_height * self.image_width, -1, dtype=np.int64)
+        np.maximum.at(last_drawn, flat_locations, np.arange(len(flat_locations)))
+
+        # Lines between neighboring pixels only cover their ends, which are already counted. Where pixels were removed
+        # from the skeleton, consecutive pixels can be further apart, so draw those few lines with their numbers
+        gaps = np.flatnonzero((np.abs(np.diff(locations, axis=0)).max(axis=1) > 1) &
+                              (root_numbers[1:] == root_numbers[:-1])) + 1
+        if gaps.size:
+            gap_image = Image.new('I', (self.image_width, self.image_height), -1)
+            gap_drawer = ImageDraw.Draw(gap_image)
+            for index in gaps.tolist():
+                gap_drawer.line([(locations[index - 1, 1], locations[index - 1, 0]),
+                                 (locations[index, 1], locations[index, 0])], index)
+            last_drawn = np.maximum(last_drawn, np.array(gap_image, dtype=np.int64).ravel())
+
+        drawn = np.flatnonzero(last_drawn >= 0)
+        array = np.array(self.image)
+        array.reshape(-1, 3)[drawn] = palette[root_numbers[last_drawn[drawn]]]
+        self.image = Image.fromarray(array, 'RGB')
 
     def print_by_nodule(self, nodule_set):
         """
@@ -148,142 +161,80 @@ class Printer:
 
         self.current_color = [255, 255, 255]
 
-        image = Image.open(self.updated_image_path)
-        drawer = ImageDraw.Draw(image)
+        drawer = ImageDraw.Draw(self.image)
 
         for pixel in nodule_set:
             drawer.ellipse(
                 (pixel.x - pixel.radius, pixel.y - pixel.radius, pixel.x + pixel.radius, pixel.y + pixel.radius),
                 tuple(self.current_color), tuple(self.current_color))
 
-        image.save(self.updated_image_path)
-
-    def count_white_px(self, nodule_set):
-
-        self.current_color = [255, 255, 255]
-
-        image = Image.fromarray(np.zeros((self.image_height, self.image_width, 3), dtype=np.uint8))
+    def save_image(self):
+        """
+        Encodes self.image to the output file. This is the only time the output image is written to disk.
+        :return: Nothing. Upon successful completion, the image can be found in the Output folder with -analysis
+        appended to the filename
+        """
+        self.image.save(self.updated_image_path)
 
+    def rasterize_nodules(self, nodule_set):
+        """
+        Draws every nodule pixel as a filled circle of its radius onto a blank canvas the size of the image.
+        :param nodule_set: A set of Pixel objects representing nodule locations
+        :return: A 2D boolean array that is True wherever a nodule was drawn
+        """
+        image = Image.new('L', (self.image_width, self.image_height))
         drawer = ImageDraw.Draw(image)
 
         for pixel in nodule_set:
             drawer.ellipse(
                 (pixel.x - pixel.radius, pixel.y - pixel.radius, pixel.x + pixel.radius, pixel.y + pixel.radius),
-                tuple(self.current_color), tuple(self.current_color))
-
-        array = np.array(image)
-
-        area_px = np.count_nonzero(array)
-
-        return area_px
+                255, 255)
 
-    def count_nodules_old(self, nodule_set):
+        return np.array(image) > 0
 
-        self.current_color = [255, 255, 255]
-
-        image = Image.fromarray(np.zeros((self.image_height, self.image_width, 3), dtype=np.uint8))
-
-        drawer = ImageDraw.Draw(image)
+    @staticmethod
+    def count_white_px(nodule_mask):
+        """
+        Measures the nodule area drawn by rasterize_nodules.
+        :param nodule_mask: 2D boolean array of nodule locations
+        :return: The number of nodule pixels, times 3. Nodule area was first measured by counting the nonzero channels
+        of a white-on-black RGB drawing, and the factor keeps results comparable with that.
+        """
+        return 3 * np.count_nonzero(nodule_mask)
 
-        for pixel in nodule_set:
-            drawer.ellipse(
-                (pixel.x - pixel.radius, pixel.y - pixel.radius, pixel.x + pixel.radius, pixel.y + pixel.radius),
-                tuple(self.current_color), tuple(self.current_color))
+    @staticmethod
+    def count_nodules(nodule_mask):
+        """
+        Counts the separate nodules drawn by rasterize_nodules, where touching circles (including diagonally) count as
+        one nodule.
+        :param nodule_mask: 2D boolean array of nodule locations
+        :return: The number of connected nodule areas
+        """
+        return ndimage.label(nodule_mask, structure=np.ones((3, 3), dtype=bool))[1]
 
-        array = np.array(image)
-
-        count = 0
-        locations = list()
-
-        for x in range(array.shape[1]):
-            for y in range(array.shape[0]):
-                if array[y][x][0] == [255]:
-                    locations.append((y, x))
-
-        while locations:
-            count += 1
-            current = set()
-            current.add(locations[0])
-            while True:
-                next_locations = set()
-                for i in current:
-                    locations.remove(i)
-                for i in current:
-                    for x in [-1, 0, 1]:
-                        for y in [-1, 0, 1]:
-                            if (i[0] + y, i[1] + x) in locations and x ** 2 + y ** 2:
-                                next_locations.add((i[0] + y, i[1] + x))
-                if len(next_locations):
-                    current = next_locations
-                else:
-                    break
-
-        return count
-
-    def count_nodules(self, nodule_set):
-        self.current_color = [255, 255, 255]
-        image = Image.fromarray(np.zeros((self.image_height, self.image_width, 3), dtype=np.uint8))
-        drawer = ImageDraw.Draw(image)
-        for pixel in nodule_set:
-            drawer.ellipse(
-                (pixel.x - pixel.radius, pixel.y - pixel.radius, pixel.x + pixel.radius, pixel.y + pixel.radius),
-                tuple(self.current_color), tuple(self.current_color))
-        array = np.array(image)
-        array = np.dot(array[..., :3], [0.299, 0.587, 0.144])
-
-        # problem block begins
-
-        count = 0
-        locations = set()
-        for y in range(0, array.shape[0]):
-            for x in range(0, array.shape[1]):
-                if array[y][x]:
-                    locations.add((y, x))
-
-        # problem block ends
-
-        while locations:
-            count += 1
-            current = set()
-            for i in locations:
-                current.add(i)
-                break
-            while True:
-                next_locations = set()
-                for i in current:
-                    locations.remove(i)
-                for i in current:
-                    for x in [-1, 0, 1]:
-                        for y in [-1, 0, 1]:
-                            if (i[0] + y, i[1] + x) in locations and x ** 2 + y ** 2:
-                                next_locations.add((i[0] + y, i[1] + x))
-                if len(next_locations):
-                    current = next_locations
-                else:
-                    break
-
-        return count
-
-    def print_test_radii(self, count, name, pixel_dict):
+    def print_test_radii(self, count, name, pixel_store):
 
         os.makedirs("../TestOutputs", exist_ok=True)
         os.makedirs("../TestOutputs/" + str(name), exist_ok=True)
 
+        mask = pixel_store.get_mask()
+        radius_array = pixel_store.get_radius_array()
+        locations = list(zip(*[axis.tolist() for axis in np.nonzero(mask)]))
+
         case_set = set()
 
-        while len(case_set) < count * .5 and len(case_set) < len(pixel_dict):
-            case = random.choice(list(pixel_dict.keys()))
-            if pixel_dict[case].radius > 2:
+        while len(case_set) < count * .5 and len(case_set) < len(locations):
+            case = random.choice(locations)
+            if radius_array[case] > 2:
                 case_set.add(case)
-        while len(case_set) < count and len(case_set) < len(pixel_dict):
-            case = random.choice(list(pixel_dict.keys()))
+        while len(case_set) < count and len(case_set) < len(locations):
+            case = random.choice(locations)
             case_set.add(case)
 
         for case in case_set:
 
-            r = pixel_dict[case].radius
-            x = pixel_dict[case].x
-            y = pixel_dict[case].y
+            r = int(radius_array[case])
+            y, x = case
 
             test_array = np.zeros((2 * r + 3, 2 * r + 3, 3), dtype=np.uint8)
 
@@ -291,7 +242,7 @@ class Printer:
                 for j in range(-r - 1, r + 2):
                     if i == j == 0:
                         test_array[r + 1 + j][r + 1 + i] = [255, 0, 0]
-                    elif (y + j, x + i) in pixel_dict:
+                    elif 0 <= y + j < self.image_height and 0 <= x + i < self.image_width and mask[y + j, x + i]:
                         test_array[j + (r + 1)][i + (r + 1)] = [255, 255, 255]
 
             output_image = Image.fromarray(test_array, 'RGB')
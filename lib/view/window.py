@@ -271,9 +271,13 @@ class MainWindow(QtWidgets.QWidget):
         self.minsize_textedit.setText(str(float(minsize)))
 
     def display_updating_image(self):
-        pixmap = QtGui.QPixmap(self.controller.config.updated_image_path)
-        if pixmap.isNull():
+        preview_image = self.controller.model.preview_image
+        if preview_image is None:
             return
+        image_data = preview_image.tobytes()
+        qimage = QtGui.QImage(image_data, preview_image.width, preview_image.height, 3 * preview_image.width,
+                              QtGui.QImage.Format_RGB888)
+        pixmap = QtGui.QPixmap.fromImage(qimage)
         w = min(pixmap.width(), self.skeleton_image_frame.maximumWidth())
         h = min(pixmap.height(), self.skeleton_image_frame.maximumHeight())
         pixmap = pixmap.scaled(w, h, QtCore.Qt.KeepAspectRatio, QtCore.Qt.SmoothTransformation)
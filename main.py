@@ -17,8 +17,8 @@ def main():
     current_controller = controller.Controller(config_obj)
 
     # initialize the Model object
-    current_model = model.Model(current_controller)
-    current_controller.model = current_model
+    current_model = model.Model(config_obj)
+    current_controller.attach_model(current_model)
 
     # initialize a Window
     app = QtWidgets.QApplication(sys.argv)
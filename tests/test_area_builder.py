@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+import lib.model.area_builder as ab
+
+
+class SetRadiiTest(unittest.TestCase):
+
+    def setUp(self):
+        # Overlapping blocks and a thin line, some of them touching the image border
+        random_state = np.random.RandomState(0)
+        self.intensity_array = np.zeros((40, 50), dtype=np.uint32)
+        for _ in range(8):
+            y, x = random_state.randint(0, 35), random_state.randint(0, 45)
+            self.intensity_array[y:y + random_state.randint(3, 15), x:x + random_state.randint(3, 15)] = 1000
+        self.intensity_array[20, :] = 1000
+
+    def set_radii(self, engine):
+        area_builder = ab.AreaBuilder()
+        area_builder.load_pixels(self.intensity_array)
+        return area_builder.set_radii(engine).copy()
+
+    def test_engines_match(self):
+        distance_radii = self.set_radii("distance_transform")
+
+        np.testing.assert_array_equal(distance_radii, self.set_radii("bfs"))
+        self.assertGreater(distance_radii.max(), 1)
+        np.testing.assert_array_equal(distance_radii < 0, self.intensity_array == 0)
+
+    def test_unknown_engine_raises(self):
+        with self.assertRaises(ValueError):
+            self.set_radii("euclidean")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from scipy import ndimage
+import numpy as np
+
+import lib.model.array_builder as arb
+
+
+def filter_as_float(rgb_array, threshold_multiplier):
+    """
+    Filters an image the way filter_array did before it used integer weights
+    :param rgb_array: 3D uint8 array of form (height, width, channel)
+    :param threshold_multiplier: Scale of the image mean intensity to threshold the image at
+    :return: The filtered 2D float64 array
+    """
+    array = np.dot(rgb_array[..., :3], [0.299, 0.587, 0.144])
+    array[array < array.mean() * threshold_multiplier] = 0
+    return ndimage.median_filter(array, size=(4, 4))
+
+
+class FilterArrayTest(unittest.TestCase):
+
+    def setUp(self):
+        # Noise over a bright diagonal band, with channels near 255 so the weighted values would overflow 8 bits
+        random_state = np.random.RandomState(0)
+        y, x = np.mgrid[0:60, 0:80]
+        band = np.abs(y - x * 0.75) < 8
+        self.rgb_array = random_state.randint(0, 60, (60, 80, 3)).astype(np.uint8)
+        self.rgb_array[band] = random_state.randint(200, 256, (np.count_nonzero(band), 3)).astype(np.uint8)
+
+    def test_mask_matches_float_path(self):
+        for threshold_multiplier in [0.5, 1, 1.5]:
+            array_builder = arb.ArrayBuilder(None)
+            array_builder.array = self.rgb_array.copy()
+            array_builder.filter_array(threshold_multiplier)
+
+            self.assertEqual(array_builder.array.dtype, np.uint32)
+            np.testing.assert_array_equal(array_builder.array != 0,
+                                          filter_as_float(self.rgb_array, threshold_multiplier) != 0)
+
+    def test_values_are_exact(self):
+        array_builder = arb.ArrayBuilder(None)
+        array_builder.array = np.full((8, 8, 3), 255, dtype=np.uint8)
+        array_builder.filter_array(0)
+
+        np.testing.assert_array_equal(array_builder.array, 255 * sum(arb.ArrayBuilder.grayscale_weights))
+
+
+class GetAreaMaskTest(unittest.TestCase):
+
+    def test_cached_mask_is_read_only(self):
+        whitelist = [(0.1, 0.1), (0.9, 0.9)]
+        blacklist = [[(0.2, 0.2), (0.4, 0.4)]]
+        masks = list()
+        for _ in range(2):
+            array_builder = arb.ArrayBuilder(None)
+            array_builder.image_height, array_builder.image_width = 37, 23
+            masks.append(array_builder.get_area_mask(whitelist, blacklist))
+
+        self.assertIs(masks[0], masks[1])
+        self.assertFalse(masks[0].flags.writeable)
+        with self.assertRaises(ValueError):
+            masks[0][0, 0] = True
+
+
+if __name__ == '__main__':
+    unittest.main()
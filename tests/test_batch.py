@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image, ImageDraw
+
+import batch
+import config
+from lib.model import model
+
+
+class AssignOutputNamesTest(unittest.TestCase):
+
+    def test_unique_names_are_kept(self):
+        self.assertEqual(batch.assign_output_names(["a/x.png", "a/y.tif"]), {"a/x.png": "x", "a/y.tif": "y"})
+
+    def test_shared_names_are_numbered(self):
+        image_paths = ["a/x.png", "b/X.png", "b/x-2.png", "b/x.tif"]
+        output_names = batch.assign_output_names(image_paths)
+
+        self.assertEqual(output_names, {"a/x.png": "x", "b/X.png": "X-3", "b/x-2.png": "x-2", "b/x.tif": "x-4"})
+        self.assertEqual(len({name.lower() for name in output_names.values()}), len(image_paths))
+
+
+class SetFilePathsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config_obj = config.Config()
+        self.config_obj.outfile_path = "out/"
+        self.model = model.Model(self.config_obj)
+
+    def test_dotted_file_name(self):
+        self.model.set_file_paths(os.path.join("images", "plant.2.day.3.png"))
+
+        self.assertEqual(self.config_obj.file_name, "plant.2.day.3")
+        self.assertEqual(self.config_obj.file_extension, ".png")
+        self.assertEqual(self.config_obj.output_name, "plant.2.day.3")
+        self.assertEqual(self.config_obj.updated_image_path, "out/plant.2.day.3-analysis.jpg")
+
+    def test_output_name(self):
+        self.model.set_file_paths(os.path.join("images", "x.tif"), "x-2")
+
+        self.assertEqual(self.config_obj.file_name, "x")
+        self.assertEqual(self.config_obj.initial_image_path, "out/x-2-initial.jpg")
+        self.assertEqual(self.config_obj.updated_image_path, "out/x-2-analysis.jpg")
+
+
+class AnalyzeImageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.image_path = os.path.join(self.output_dir, "roots.png")
+        image = Image.new('RGB', (200, 300))
+        ImageDraw.Draw(image).line((100, 10, 100, 290), fill=(220, 210, 190), width=7)
+        image.save(self.image_path)
+
+        self.config_obj = config.Config()
+        self.config_obj.outfile_path = os.path.join(self.output_dir, "")
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_failed_image_removes_initial_image(self):
+        self.config_obj.nodule_counting_engine = "vector"
+        with self.assertRaises(ValueError):
+            batch.analyze_image(self.image_path, self.config_obj)
+
+        self.assertFalse(os.path.exists(self.config_obj.initial_image_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import math
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image, ImageDraw, ImageFilter
+
+import config
+from lib.model import model, nodule_counter, pixel
+from lib.view import printer
+
+
+def draw_root_system(path, seed):
+    """
+    Draws a synthetic root system on a dark background: a main root growing down from the top center, with lateral
+    roots that wander, cross and branch again, plus a few specks of debris
+    :param path: The path to save the image to
+    :param seed: Seed for the random layout, so the same seed always draws the same image
+    :return: Nothing.
+    """
+    rng = random.Random(seed)
+    image = Image.new('RGB', (600, 900))
+    draw = ImageDraw.Draw(image)
+
+    # Each entry is (x, y, angle, width, length) for a root still to be drawn
+    roots = [(300.0, 20.0, math.pi / 2, rng.choice((9, 11, 13)), 810)]
+    while roots:
+        x, y, angle, width, length = roots.pop()
+        for step in range(0, length, 6):
+            # Roots wander a little, but tend back towards growing straight down
+            angle += rng.uniform(-0.12, 0.12) + 0.08 * (math.pi / 2 - angle)
+            new_x, new_y = x + 6 * math.cos(angle), y + 6 * math.sin(angle)
+            shade = rng.randint(180, 230)
+            color = (shade, shade - 10, shade - 30)
+            draw.line((x, y, new_x, new_y), fill=color, width=width)
+            draw.ellipse((new_x - width / 2, new_y - width / 2, new_x + width / 2, new_y + width / 2), fill=color)
+            x, y = new_x, new_y
+
+            if width > 3 and step > 30 and rng.random() < 0.06:
+                side = rng.choice((-1, 1))
+                roots.append((x, y, angle + side * rng.uniform(0.8, 1.3), max(3, width // 2), (length - step) // 2))
+
+    for _ in range(6):
+        center_x, center_y = rng.randint(50, 550), rng.randint(50, 850)
+        draw.ellipse((center_x - 2, center_y - 2, center_x + 2, center_y + 2), fill=(200, 200, 200))
+
+    image.filter(ImageFilter.GaussianBlur(1)).save(path)
+
+
+class MeasureNodulesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config_obj = config.Config()
+        self.model = model.Model(self.config_obj)
+        self.nodule_set = {pixel.Pixel(10, 10, 3), pixel.Pixel(14, 10, 2), pixel.Pixel(30, 30, 3)}
+
+    def test_unknown_engine_raises(self):
+        self.config_obj.nodule_counting_engine = "vector"
+        with self.assertRaises(ValueError):
+            self.model.measure_nodules(self.nodule_set)
+
+    def test_counter_only_made_for_geometry_engine(self):
+        self.model.printer = printer.Printer(None, (50, 50))
+
+        self.config_obj.nodule_counting_engine = "raster"
+        self.model.measure_nodules(self.nodule_set)
+        self.assertIsNone(self.model.nodule_counter)
+
+        self.config_obj.nodule_counting_engine = "geometry"
+        self.assertEqual(self.model.measure_nodules(self.nodule_set)[0], 2)
+        self.assertIsNotNone(self.model.nodule_counter)
+
+    def test_geometry_engine_reuses_counter(self):
+        self.config_obj.nodule_counting_engine = "geometry"
+        self.model.nodule_counter = nodule_counter.NoduleCounter(50, 50)
+
+        first_result = self.model.measure_nodules(self.nodule_set)
+        footprints = dict(self.model.nodule_counter.footprint_dict)
+        second_result = self.model.measure_nodules(self.nodule_set)
+
+        self.assertEqual(first_result[0], 2)
+        self.assertEqual(first_result, second_result)
+        for radius, footprint in footprints.items():
+            self.assertIs(self.model.nodule_counter.footprint_dict[radius], footprint)
+
+
+class RunAnalysisTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.image_path = os.path.join(self.output_dir, "roots.png")
+        draw_root_system(self.image_path, 1)
+
+        self.config_obj = config.Config()
+        self.config_obj.outfile_path = os.path.join(self.output_dir, "")
+        self.model = model.Model(self.config_obj)
+        self.model.set_file_paths(self.image_path)
+        self.model.spawn_proper_infile()
+        self.config_obj.seedYX = self.config_obj.batch_seedYX
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_without_nodules(self):
+        self.config_obj.search_for_nodules = False
+        preview_sizes = list()
+        self.model.image_listeners.append(lambda: preview_sizes.append(self.model.preview_image.size))
+        self.model.run_analysis()
+
+        # The preview is a copy of the whole canvas, so it shouldn't outlive the run
+        self.assertTrue(preview_sizes)
+        self.assertIsNone(self.model.preview_image)
+
+        self.assertEqual(self.model.csv_out_string.count(","), 3)
+        self.assertTrue(os.path.isfile(self.config_obj.updated_image_path))
+        self.assertIsNone(self.model.nodule_finder)
+        self.assertIsNone(self.model.root_builder)
+
+    def test_measurements(self):
+        self.config_obj.search_for_nodules = False
+        self.model.run_analysis()
+
+        # Four runs of the set-based tree search this replaced measured 7.55-7.69 cm of root on this image. The image
+        # goes through Pillow's drawing, blur and JPEG encoding, which vary a little between builds, so the values are
+        # only checked to within that
+        name, length, diameter, area = self.model.csv_out_string.strip().split(",")
+        self.assertEqual(name, "roots")
+        self.assertGreaterEqual(float(length), 7.55)
+        self.assertLessEqual(float(length), 7.69)
+        self.assertAlmostEqual(float(diameter), 0.0234, delta=0.001)
+        self.assertAlmostEqual(float(area), 0.1456, delta=0.002)
+
+
+if __name__ == '__main__':
+    unittest.main()
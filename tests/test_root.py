@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+
+from lib.model import pixel, root
+
+
+def build_root(locations, key):
+    """
+    Builds a Root from a list of locations
+    :param locations: List of tuples of form (int y, int x, int radius)
+    :param key: The root's key
+    :return: The Root
+    """
+    return root.Root([pixel.Pixel(x, y, radius) for y, x, radius in locations], key)
+
+
+class CoordinateArrayTest(unittest.TestCase):
+
+    def assert_matches_pixels(self, test_root):
+        expected = [(test_pixel.y, test_pixel.x, test_pixel.radius) for test_pixel in test_root.pixel_list]
+        np.testing.assert_array_equal(test_root.coordinate_array, np.array(expected, dtype=np.int64).reshape(-1, 3))
+
+    def test_built_from_pixels(self):
+        self.assert_matches_pixels(build_root([(1, 2, 3), (2, 2, 4)], 0))
+        self.assert_matches_pixels(build_root([], 1))
+
+    def test_combine_keeps_coordinates_in_step(self):
+        first_root = build_root([(0, 0, 1), (1, 1, 2)], 0)
+        second_root = build_root([(1, 1, 2), (2, 1, 2), (3, 2, 1)], 1)
+        third_root = build_root([(3, 2, 1), (4, 2, 1)], 2)
+
+        # Coordinates handed over as slices of one array, the way RootBuilder sets them
+        coordinate_array = np.array([(0, 0, 1), (1, 1, 2), (1, 1, 2), (2, 1, 2), (3, 2, 1)], dtype=np.int64)
+        first_root.coordinate_segment_list = [coordinate_array[:2]]
+        second_root.coordinate_segment_list = [coordinate_array[2:]]
+
+        first_root.combine(second_root)
+        self.assert_matches_pixels(first_root)
+
+        # A root without coordinates yet falls back to building them from the combined pixels
+        first_root.combine(third_root)
+        self.assertIsNone(first_root.coordinate_segment_list)
+        self.assert_matches_pixels(first_root)
+
+
+class RemoveEdgeRootTest(unittest.TestCase):
+
+    def build_family(self):
+        # A parent with two branches at its endpoint, linked up the way RootBuilder links them
+        parent_root = build_root([(0, 0, 1), (1, 0, 1)], 0)
+        branches = [build_root([(1, 0, 1), (2, 0, 1)], 1), build_root([(1, 0, 1), (2, 1, 1)], 2)]
+        for branch in branches:
+            parent_root.branches_at_endpoint[branch] = branch
+            parent_root.branch_dict[branch] = (1, branch)
+            branch.parent_root = parent_root
+
+        return parent_root, branches
+
+    def test_detaches_from_parent(self):
+        parent_root, branches = self.build_family()
+
+        self.assertIsNone(branches[0].remove_edge_root())
+        self.assertEqual(list(parent_root.branches_at_endpoint), [branches[1]])
+        self.assertEqual(list(parent_root.branch_dict), [branches[1]])
+
+        # Once the last branch is gone, the parent is an edge root itself
+        self.assertIs(branches[1].remove_edge_root(), parent_root)
+        self.assertFalse(parent_root.branches_at_endpoint)
+        self.assertFalse(parent_root.branch_dict)
+
+    def test_root_without_parent(self):
+        self.assertIsNone(build_root([(0, 0, 1)], 0).remove_edge_root())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,241 @@
+import unittest
+
+import numpy as np
+
+import lib.model.area_builder as ab
+import lib.model.pixel as px
+import lib.model.pixel_store as ps
+import lib.model.tree_builder as tb
+
+
+# A small skeleton with a fork, a merge and a stray pixel in the top right corner that no seed can reach
+SKELETON_ROWS = ["...#...#",
+                 "...#....",
+                 "..###...",
+                 ".#####..",
+                 "#..#..#.",
+                 "#..##..#",
+                 "..#..#..",
+                 ".#....#."]
+
+# A pixel at the bottom left with one candidate parent above it and another diagonally up and to the right
+CORNER_ROWS = [".#.",
+               "##.",
+               "#.."]
+
+
+def build_tree_builder(rows, seed_y, seed_x):
+    """
+    Builds a TreeBuilder over a skeleton drawn as text, with every pixel at radius 0
+    :param rows: List of strings of equal length, with '#' marking foreground
+    :param seed_y: The y-location of the seed pixel
+    :param seed_x: The x-location of the seed pixel
+    :return: The TreeBuilder, with its single seed set
+    """
+    mask = np.array([[character == '#' for character in row] for row in rows])
+    pixel_store = ps.PixelStore(mask.astype(np.uint32) * 1000)
+    pixel_store.radius[pixel_store.alive] = 0
+
+    tree_builder = tb.TreeBuilder(pixel_store)
+    tree_builder.all_seed_pixels = {pixel_store.get_pixel(seed_y * pixel_store.width + seed_x)}
+    return tree_builder
+
+
+def build_area_builder(intensity_array):
+    """
+    Builds an AreaBuilder over a filtered image, with its radii set
+    :param intensity_array: 2D numpy array of non-negative intensities, where 0 is background
+    :return: The AreaBuilder
+    """
+    area_builder = ab.AreaBuilder()
+    area_builder.load_pixels(intensity_array)
+    area_builder.set_radii()
+    return area_builder
+
+
+def prune_sequentially(mask, radius_array, intensity_array):
+    """
+    Thins a mask one pixel at a time, the way prune_redundant_pixels did before it worked on whole layers
+    :param mask: 2D boolean array of the foreground
+    :param radius_array: 2D array of the radius at every location
+    :param intensity_array: 2D array of the intensity at every location
+    :return: A 2D boolean array of the pixels left after thinning
+    """
+    height, width = mask.shape
+    alive = mask.copy()
+
+    def neighbors(y, x):
+        for delta_y, delta_x in px.Pixel.neighbor_offsets:
+            if 0 <= y + delta_y < height and 0 <= x + delta_x < width:
+                yield y + delta_y, x + delta_x
+            else:
+                yield None
+
+    # The first layer is sorted by intensity, with ties left in row-major order
+    locations = [(y, x) for y, x in zip(*np.nonzero(mask)) if radius_array[y, x] == 0]
+    current_list = sorted(locations, key=lambda location: intensity_array[location])
+    current_radius_value = 0
+
+    while current_list:
+        current_radius_value += 1
+        current_set = set(current_list)
+        next_list = list()
+        next_set = set()
+
+        for y, x in current_list:
+            for neighbor in neighbors(y, x):
+                if neighbor and alive[neighbor] and radius_array[neighbor] == current_radius_value and \
+                        neighbor not in current_set and neighbor not in next_set:
+                    next_list.append(neighbor)
+                    next_set.add(neighbor)
+
+            loc_list = [i for i, neighbor in enumerate(neighbors(y, x)) if neighbor and alive[neighbor]]
+            if not loc_list or not tb.TreeBuilder.check_sequences(loc_list):
+                alive[y, x] = False
+
+        current_list = next_list
+
+    return alive
+
+
+def find_levels(rows, seeds):
+    """
+    Walks a skeleton drawn as text outward from its seeds, one step at a time
+    :param rows: List of strings of equal length, with '#' marking foreground
+    :param seeds: List of (y, x) locations to start from
+    :return: Dictionary of form {(y, x): int level}, counted from 1 at the seeds, for every location that was reached
+    """
+    levels = {seed: 1 for seed in seeds}
+    current_list = list(seeds)
+    while current_list:
+        next_list = list()
+        for y, x in current_list:
+            for delta_y, delta_x in px.Pixel.neighbor_offsets:
+                neighbor = (y + delta_y, x + delta_x)
+                if 0 <= neighbor[0] < len(rows) and 0 <= neighbor[1] < len(rows[0]) and \
+                        rows[neighbor[0]][neighbor[1]] == '#' and neighbor not in levels:
+                    levels[neighbor] = levels[(y, x)] + 1
+                    next_list.append(neighbor)
+        current_list = next_list
+
+    return levels
+
+
+class SetTreeRelationshipsTest(unittest.TestCase):
+
+    def test_parents_are_one_level_closer(self):
+        tree_builder = build_tree_builder(SKELETON_ROWS, 0, 3)
+        tree_builder.set_tree_relationships()
+
+        width = len(SKELETON_ROWS[0])
+        levels = find_levels(SKELETON_ROWS, [(0, 3)])
+        parents = tree_builder.pixel_store.parent
+        for y, row in enumerate(SKELETON_ROWS):
+            for x, character in enumerate(row):
+                parent = parents[y * width + x]
+                if (y, x) not in levels or levels[(y, x)] == 1:
+                    self.assertEqual(parent, -1)
+                else:
+                    parent_y, parent_x = divmod(int(parent), width)
+                    self.assertLessEqual(max(abs(parent_y - y), abs(parent_x - x)), 1)
+                    self.assertEqual(levels.get((parent_y, parent_x)), levels[(y, x)] - 1)
+
+    def test_unreachable_pixels_have_no_parent(self):
+        tree_builder = build_tree_builder(SKELETON_ROWS, 0, 3)
+        tree_builder.set_tree_relationships()
+
+        # The stray pixel in the top right corner doesn't touch the rest of the skeleton
+        self.assertEqual(tree_builder.pixel_store.parent[7], -1)
+
+    def test_ties_go_to_lowest_key(self):
+        tree_builder = build_tree_builder(CORNER_ROWS, 0, 1)
+        tree_builder.set_tree_relationships()
+
+        # The bottom left pixel has candidates directly above it and diagonally up and to the right
+        candidates = np.array([1 * 3 + 0, 1 * 3 + 1])
+        keys = tb.TreeBuilder.scramble_locations(candidates)
+        self.assertEqual(tree_builder.pixel_store.parent[2 * 3 + 0], candidates[keys.argmin()])
+
+    def test_ties_favor_no_direction(self):
+        # In a band two pixels wide, every pixel past the first row has a candidate directly above it and a diagonal one
+        rows = ["##"] * 400
+        tree_builder = build_tree_builder(rows, 0, 0)
+        tree_builder.set_tree_relationships()
+
+        parents = tree_builder.pixel_store.parent[2 * 2:]
+        straight_share = np.mean(parents == np.arange(2 * 2, 2 * 400) - 2)
+        self.assertGreater(straight_share, 0.35)
+        self.assertLess(straight_share, 0.65)
+
+    def test_parents_are_repeatable(self):
+        results = list()
+        for _ in range(2):
+            tree_builder = build_tree_builder(SKELETON_ROWS, 0, 3)
+            tree_builder.set_tree_relationships()
+            results.append(tree_builder.pixel_store.parent.copy())
+
+        np.testing.assert_array_equal(results[0], results[1])
+
+
+class FindSmallAreasTest(unittest.TestCase):
+
+    def setUp(self):
+        # A large area on the left, and a 4x4 speck one column of background away from it
+        self.intensity_array = np.zeros((20, 20), dtype=np.uint32)
+        self.intensity_array[2:18, 2:10] = 1000
+        self.intensity_array[5:9, 11:15] = 1000
+
+    def test_speck_removed_whole(self):
+        area_builder = build_area_builder(self.intensity_array)
+        tree_builder = tb.TreeBuilder(area_builder.pixel_store)
+        tree_builder.find_small_areas(20)
+
+        # Nothing of the speck is left behind, not even the ring around its seed, and the large area is untouched
+        expected = self.intensity_array != 0
+        expected[:, 10:] = False
+        np.testing.assert_array_equal(area_builder.pixel_store.get_mask(), expected)
+        self.assertEqual(len(tree_builder.all_seed_pixels), 1)
+        self.assertLess(next(iter(tree_builder.all_seed_pixels)).x, 10)
+
+    def test_area_measured_whole(self):
+        area_builder = build_area_builder(self.intensity_array)
+        tree_builder = tb.TreeBuilder(area_builder.pixel_store)
+        tree_builder.find_small_areas(16)
+
+        # The speck has exactly the minimum size, so it's kept with a seed of its own
+        np.testing.assert_array_equal(area_builder.pixel_store.get_mask(), self.intensity_array != 0)
+        self.assertEqual(len(tree_builder.all_seed_pixels), 2)
+
+
+class PruneRedundantPixelsTest(unittest.TestCase):
+
+    def assert_matches_sequential(self, intensity_array):
+        area_builder = build_area_builder(intensity_array)
+        pixel_store = area_builder.pixel_store
+        expected = prune_sequentially(pixel_store.get_mask().copy(), pixel_store.get_radius_array().copy(),
+                                      pixel_store.get_intensity_array().copy())
+
+        tb.TreeBuilder(pixel_store).prune_redundant_pixels()
+
+        np.testing.assert_array_equal(pixel_store.get_mask(), expected)
+
+    def test_uniform_block(self):
+        intensity_array = np.zeros((24, 30), dtype=np.uint32)
+        intensity_array[3:21, 2:27] = 1000
+        self.assert_matches_sequential(intensity_array)
+
+    def test_intensity_ties(self):
+        # Overlapping shapes with only two intensity levels, so most of each layer is ordered by its ties
+        random_state = np.random.RandomState(0)
+        mask = np.zeros((40, 40), dtype=bool)
+        mask[4:18, 3:30] = True
+        mask[12:36, 20:27] = True
+        for i in range(30):
+            mask[8 + i, max(i - 2, 0):i + 4] = True
+
+        intensity_array = np.where(mask, random_state.randint(1, 3, mask.shape) * 1000, 0).astype(np.uint32)
+        self.assert_matches_sequential(intensity_array)
+
+
+if __name__ == '__main__':
+    unittest.main()